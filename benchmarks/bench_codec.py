@@ -0,0 +1,70 @@
+"""
+Before/after measurement of the history storage formats in my_proof.codec.
+
+Builds a realistic wallet history (several order-history files per contribution type, hashed
+with process_secured_data) and reports, per storage format, the bytes stored in Redis and the
+time to encode and decode the whole history, as proof_of_uniqueness.main does on every run.
+Run with:
+
+    python -m benchmarks.bench_codec [--files 40] [--orders 1500] [--hash-version 1]
+"""
+import argparse
+import json
+import time
+
+from my_proof import codec
+from my_proof.proof_of_uniqueness import process_secured_data
+from benchmarks.bench_hashing import make_contributions
+
+
+def build_history(files, orders, hash_version):
+    history = []
+    for idx in range(files):
+        contributions = make_contributions(orders, seed=idx)
+        contributions.append({
+            "type": "REDDIT",
+            "securedSharedData": {"username": f"user{idx}", "karma": idx * 17, "subreddits": [f"r/{n}" for n in range(40)]},
+        })
+        history.append(process_secured_data(contributions, hash_version))
+    return history
+
+
+def measure(history, codec_name, compression, repeat=3):
+    encoded = [codec.encode(processed, codec_name, compression) for processed in history]
+    size = sum(len(value) for value in encoded)
+
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    encode_time = best(lambda: [codec.encode(processed, codec_name, compression) for processed in history])
+    decode_time = best(lambda: [codec.decode(value) for value in encoded])
+    assert [codec.decode(value) for value in encoded] == history
+    return {"bytes": size, "encode_ms": round(encode_time * 1000, 1), "decode_ms": round(decode_time * 1000, 1)}
+
+
+def run(files, orders, hash_version):
+    history = build_history(files, orders, hash_version)
+    formats = [("json", "none"), ("compact", "none"), ("compact", "zlib")]
+    if codec.lz4_frame is not None:
+        formats.append(("compact", "lz4"))
+
+    results = {f"{name}+{compression}": measure(history, name, compression) for name, compression in formats}
+    baseline = results["json+none"]
+    for result in results.values():
+        result["size_ratio"] = round(result["bytes"] / baseline["bytes"], 3)
+        result["decode_speedup"] = round(baseline["decode_ms"] / result["decode_ms"], 2) if result["decode_ms"] else None
+    return {"files": files, "orders_per_file": orders, "hash_version": hash_version, "formats": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--orders", type=int, default=1500)
+    parser.add_argument("--hash-version", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(run(args.files, args.orders, args.hash_version), indent=2))
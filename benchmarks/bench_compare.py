@@ -0,0 +1,74 @@
+"""
+Scaling of compare_secured_data against the vectorized engine.
+
+Generates random digests for one contribution type spread over several earlier files and times
+both engines. The legacy engine only sees the last earlier file, so its counts differ by
+design; the vectorized counts are checked against an exact set-based computation over all files.
+Run with:
+
+    python -m benchmarks.bench_compare [--hashes 200000] [--files 20] [--overlap 0.5]
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+from my_proof.proof_of_uniqueness import compare_secured_data
+from my_proof.vectorized_uniqueness import compare_secured_data_vectorized, merge_history, compare_with_history
+
+
+def random_digests(count, rng):
+    return [rng.getrandbits(256).to_bytes(32, "big").hex() for _ in range(count)]
+
+
+def build(hashes, files, overlap, seed=3):
+    rng = random.Random(seed)
+    history_pool = random_digests(hashes, rng)
+    per_file = max(1, hashes // files)
+    old = [
+        {"type": "AMAZON_PRIME", "securedSharedData": {"orders": history_pool[idx * per_file:(idx + 1) * per_file]}}
+        for idx in range(files)
+    ]
+    seen = int(hashes * overlap)
+    curr_orders = rng.sample(history_pool, seen) + random_digests(hashes - seen, rng)
+    curr = [{"type": "AMAZON_PRIME", "securedSharedData": {"orders": curr_orders}}]
+    expected_unique = len(set(curr_orders) - set(history_pool[:per_file * files]))
+    return curr, old, expected_unique
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+
+def run(hashes, files, overlap):
+    curr, old, expected_unique = build(hashes, files, overlap)
+    legacy, legacy_ms = timed(lambda: compare_secured_data(curr, old))
+    vectorized, vectorized_ms = timed(lambda: compare_secured_data_vectorized(curr, old))
+    merged, merge_ms = timed(lambda: merge_history(old))
+    _, compare_ms = timed(lambda: compare_with_history(curr, merged))
+    return {
+        "hashes_per_side": hashes,
+        "history_files": files,
+        "expected_unique": expected_unique,
+        "legacy": {"ms": legacy_ms, "unique": legacy["comparison_results"][0]["unique_hashes_in_curr"]},
+        "vectorized": {
+            "ms": vectorized_ms,
+            "merge_ms": merge_ms,
+            "compare_ms": compare_ms,
+            "unique": vectorized["comparison_results"][0]["unique_hashes_in_curr"],
+        },
+        "vectorized_exact": vectorized["comparison_results"][0]["unique_hashes_in_curr"] == expected_unique,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hashes", type=int, default=200000)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--overlap", type=float, default=0.5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # compare_secured_data logs every hash
+    print(json.dumps(run(args.hashes, args.files, args.overlap), indent=2))
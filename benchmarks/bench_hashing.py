@@ -0,0 +1,118 @@
+"""
+Micro-benchmark of process_secured_data: the original hashing against my_proof.hashing.
+
+Builds an order-history style contribution (a list of order dicts with repeated fields) and
+times hashing it with the original recursive SHA-256 implementation, the version 1 format
+(same digests) and the version 2 format. The history case hashes the current file plus earlier
+exports of the same wallet, which mostly repeat the same orders, as happens when history files
+are downloaded. Run with:
+
+    python -m benchmarks.bench_hashing [--orders 5000] [--history 5] [--repeat 5]
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+
+from my_proof import hashing
+from my_proof.proof_of_uniqueness import process_secured_data
+
+
+def original_hash_value(value):
+    return hashlib.sha256(value.encode()).hexdigest() if isinstance(value, str) else original_hash_value(json.dumps(value))
+
+def original_process_secured_data(contributions):
+    processed = []
+    for entry in contributions:
+        secured_data = entry.get("securedSharedData")
+        hashed_data = {
+            key: (
+                {k: original_hash_value(v) for k, v in value.items()} if isinstance(value, dict) else
+                [original_hash_value(item) for item in value] if isinstance(value, list) else
+                original_hash_value(value)
+            )
+            for key, value in secured_data.items()
+        }
+        processed.append({"type": entry.get("type"), "securedSharedData": hashed_data})
+    return processed
+
+
+def make_contributions(orders, seed=7):
+    rng = random.Random(seed)
+    restaurants = [f"restaurant-{i}" for i in range(50)]
+    order_list = [
+        {
+            "orderId": f"ORD{rng.randrange(10 ** 9)}",
+            "restaurant": rng.choice(restaurants),
+            "amount": round(rng.uniform(5, 80), 2),
+            "items": [rng.choice(["pizza", "burger", "salad", "sushi"]) for _ in range(rng.randint(1, 4))],
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        }
+        for _ in range(orders)
+    ]
+    return [{
+        "type": "ZOMATO",
+        "securedSharedData": {
+            "orders": order_list,
+            "favourites": restaurants[:10],
+            # Signed zeros hash differently, so a memo must not treat them as one value
+            "profile": {"city": "Pune", "member_since": 2019, "orders_count": orders, "credit": 0.0, "refunds": -0.0},
+        },
+    }]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        hashing.clear_memo()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def digest_bytes(processed):
+    return sum(len(json.dumps(entry["securedSharedData"])) for entry in processed)
+
+
+def compare(label, files, repeat):
+    def hash_all(process, *args):
+        return [process(contributions, *args) for contributions in files]
+
+    original_time, original = best_of(lambda: hash_all(original_process_secured_data), repeat)
+    v1_time, v1 = best_of(lambda: hash_all(process_secured_data, hashing.HASH_VERSION_LEGACY), repeat)
+    v2_time, v2 = best_of(lambda: hash_all(process_secured_data, hashing.HASH_VERSION_FAST), repeat)
+    return {
+        "case": label,
+        "v1_matches_original": v1 == original,
+        "seconds": {"original": round(original_time, 4), "v1": round(v1_time, 4), "v2": round(v2_time, 4)},
+        "speedup": {"v1": round(original_time / v1_time, 2), "v2": round(original_time / v2_time, 2)},
+        "processed_json_bytes": {"v1": sum(map(digest_bytes, v1)), "v2": sum(map(digest_bytes, v2))},
+    }
+
+
+def run(orders, history, repeat):
+    current = make_contributions(orders)
+    # Each earlier export holds a growing prefix of the same order history
+    earlier = [make_contributions(orders * (i + 1) // (history + 1)) for i in range(history)]
+    return {
+        "orders": orders,
+        "history_files": history,
+        "results": [
+            compare("single file", [current], repeat),
+            compare("file with history", [current] + earlier, repeat),
+        ],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--history", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    report = run(args.orders, args.history, args.repeat)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if all(result["v1_matches_original"] for result in report["results"]) else 1)
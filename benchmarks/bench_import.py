@@ -0,0 +1,78 @@
+"""
+Import-time budget of the proof entry point.
+
+Imports my_proof.__main__ in fresh interpreters with `python -X importtime`, takes the median
+cumulative import time over --repeat runs and fails if it exceeds the budget, or if any module
+that should only load on the code path that needs it (numpy, pandas, pydantic, redis, gnupg,
+requests) is imported at startup. Prints a JSON report with the slowest imports. Run with:
+
+    python -m benchmarks.bench_import [--budget-ms 150] [--repeat 5] [--module my_proof.__main__]
+
+The budget can also be set with IMPORT_BUDGET_MS.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFERRED_MODULES = ["numpy", "pandas", "pydantic", "redis", "gnupg", "requests"]
+
+
+def parse_importtime(stderr):
+    """:return: {module: (self microseconds, cumulative microseconds)} from -X importtime output"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        timings[name] = (int(self_us), int(cumulative_us))
+    return timings
+
+def measure(module):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if completed.returncode:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the proof entry point")
+    parser.add_argument("--module", default="my_proof.__main__")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", 150)))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    totals_ms = [run[args.module][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals_ms)
+    last = runs[-1]
+    deferred_loaded = [name for name in DEFERRED_MODULES if name in last]
+    slowest = sorted(last.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+
+    report = {
+        "benchmark": "bench_import",
+        "module": args.module,
+        "budget_ms": args.budget_ms,
+        "median_ms": round(median_ms, 2),
+        "runs_ms": [round(total, 2) for total in totals_ms],
+        "deferred_modules_loaded": deferred_loaded,
+        "slowest_self_ms": {name: round(self_us / 1000, 2) for name, (self_us, _) in slowest},
+        "checks": {
+            "within budget": median_ms <= args.budget_ms,
+            "heavy modules deferred": not deferred_loaded,
+        },
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if all(report["checks"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
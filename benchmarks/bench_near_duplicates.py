@@ -0,0 +1,171 @@
+"""
+Scaling of the cross-wallet near-duplicate index.
+
+Fills the index with synthetic contributions of random 64-bit items, one wallet per
+--per-wallet contributions. At every checkpoint (each power of ten, and the final size) it runs
+--queries queries of two kinds. Planted queries are copies of an indexed contribution with
+--edit of their items replaced, sent from another wallet; they should find the original.
+Unrelated queries are fresh contributions; they should find nothing. The JSON report has insert
+throughput, query latency, candidates per query, recall of the planted copies and the false
+positive rate at each checkpoint. It fails if recall is below --min-recall or false positives
+are above --max-false-positives at the final size. Run with:
+
+    python -m benchmarks.bench_near_duplicates [--contributions 1000000] [--items 50] [--edit 0.2]
+    python -m benchmarks.bench_near_duplicates --backend redis --redis-port 6379 --contributions 100000
+
+Without --redis-port the redis backend runs against benchmarks.fake_redis, which is only fit
+for small sizes.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_proof import git_commit
+from benchmarks.load_test import percentile
+from my_proof.metrics import peak_rss_bytes
+from my_proof.near_duplicates import LSH_BANDS, LSH_ROWS, LocalNearDuplicateIndex, RedisNearDuplicateIndex, minhash
+
+TASK_TYPE = "UBER"
+INSERT_BATCH = 1000
+
+
+def make_items(rng, count):
+    return rng.integers(0, 2 ** 64, size=count, dtype=np.uint64)
+
+def edited_copy(rng, items, edit):
+    """Replace a fraction edit of the items, as a lightly edited re-upload would."""
+    replaced = int(round(len(items) * edit))
+    kept = rng.permutation(items)[:len(items) - replaced]
+    return np.concatenate([kept, make_items(rng, replaced)])
+
+def checkpoints(total):
+    points = [10 ** power for power in range(3, 10) if 10 ** power < total]
+    return points + [total]
+
+
+def run_queries(index, rng, items_by_member, args, indexed):
+    """:return: Query latency, candidates, recall and false positive figures at the current size"""
+    latencies, candidates = [], []
+    found = false_positives = 0
+    for _ in range(args.queries):
+        member = int(rng.integers(0, indexed))
+        signature = minhash(edited_copy(rng, items_by_member(member), args.edit))
+        start = time.perf_counter()
+        matches = index.query(TASK_TYPE, signature, "0xquery", None, args.top_k, args.threshold)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += any(file_id == f"f{member}" for file_id, _ in matches)
+        # Everything sharing a bucket, to show how much of the index a query looks at
+        candidates.append(len(index.query(TASK_TYPE, signature, "0xquery", None, 10 ** 9, 0.0)))
+
+        unrelated = minhash(make_items(rng, args.items))
+        false_positives += bool(index.query(TASK_TYPE, unrelated, "0xquery", None, args.top_k, args.threshold))
+    return {
+        "contributions": indexed,
+        "query_ms": {"p50": round(percentile(latencies, 0.5), 3), "p99": round(percentile(latencies, 0.99), 3)},
+        "candidates_per_query": round(sum(candidates) / len(candidates), 1),
+        "recall": round(found / args.queries, 4),
+        "false_positive_rate": round(false_positives / args.queries, 4),
+    }
+
+
+def run(args, index):
+    rng = np.random.default_rng(args.seed)
+    # Contribution n holds the items n * items .. (n + 1) * items - 1, offset by the seed. They are
+    # regenerated when needed instead of kept; MinHash scrambles them, so being consecutive is fine.
+    offset = args.seed * args.contributions * args.items
+    items_by_member = lambda member: np.arange(
+        offset + member * args.items, offset + (member + 1) * args.items, dtype=np.uint64
+    )
+    pipeline = index.redis.pipeline(transaction=False) if isinstance(index, RedisNearDuplicateIndex) else None
+
+    report = []
+    indexed = 0
+    insert_seconds = 0.0
+    for checkpoint in checkpoints(args.contributions):
+        start = time.perf_counter()
+        for member in range(indexed, checkpoint):
+            signature = minhash(items_by_member(member))
+            wallet = f"0x{member // args.per_wallet:040x}"
+            if pipeline is None:
+                index.add(TASK_TYPE, f"f{member}", wallet, signature)
+            else:
+                index.queue_add(pipeline, TASK_TYPE, f"f{member}", wallet, signature)
+                if len(pipeline) >= INSERT_BATCH:
+                    pipeline.execute()
+        if pipeline is not None:
+            pipeline.execute()
+        insert_seconds += time.perf_counter() - start
+        indexed = checkpoint
+
+        point = run_queries(index, rng, items_by_member, args, indexed)
+        point["inserts_per_second"] = round(indexed / insert_seconds) if insert_seconds else None
+        point["peak_rss_mb"] = round(peak_rss_bytes() / 2 ** 20, 1) if peak_rss_bytes() else None
+        logging.info(f"{indexed} contributions: {point}")
+        report.append(point)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--contributions", type=int, default=1000000)
+    parser.add_argument("--items", type=int, default=50, help="Hashes per contribution")
+    parser.add_argument("--per-wallet", type=int, default=5, help="Contributions per synthetic wallet")
+    parser.add_argument("--edit", type=float, default=0.2, help="Fraction of items replaced in planted copies")
+    parser.add_argument("--queries", type=int, default=200, help="Planted and unrelated queries per checkpoint")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="local", choices=["local", "redis"])
+    parser.add_argument("--redis-host", default="127.0.0.1")
+    parser.add_argument("--redis-port", type=int)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--max-false-positives", type=float, default=0.01)
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    fake_redis = None
+    if args.backend == "redis":
+        import redis
+        if args.redis_port is None:
+            from benchmarks.fake_redis import FakeRedisServer
+            fake_redis = FakeRedisServer().__enter__()
+            args.redis_host, args.redis_port = "127.0.0.1", fake_redis.port
+        index = RedisNearDuplicateIndex(redis.StrictRedis(host=args.redis_host, port=args.redis_port))
+    else:
+        index = LocalNearDuplicateIndex()
+    try:
+        points = run(args, index)
+    finally:
+        if fake_redis:
+            fake_redis.__exit__(None, None, None)
+
+    final = points[-1]
+    # Jaccard similarity of a planted copy with its original, and the chance they share a bucket
+    jaccard = (1 - args.edit) / (1 + args.edit)
+    report = {
+        "benchmark": "bench_near_duplicates",
+        "commit": git_commit(),
+        "params": {key: value for key, value in vars(args).items() if key != "out"},
+        "planted_jaccard": round(jaccard, 3),
+        "expected_candidate_rate": round(1 - (1 - jaccard ** LSH_ROWS) ** LSH_BANDS, 4),
+        "checkpoints": points,
+        "checks": {
+            "recall": final["recall"] >= args.min_recall,
+            "false positives": final["false_positive_rate"] <= args.max_false_positives,
+        },
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0 if all(report["checks"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+End-to-end benchmark of a proof run against local stand-ins for the validator and Redis.
+
+Generates a synthetic wallet (benchmarks.synthetic), serves its earlier files GPG encrypted from
+benchmarks.fake_validator and runs `python -m my_proof` in a subprocess per measurement, so
+import time and process start are included as in production. Scenarios:
+
+    cold      Redis is empty, so every earlier file is downloaded, decrypted and hashed
+    warm      Redis already holds every earlier file's hashes, as their own proofs left them
+    no_redis  Redis is unreachable, so every earlier file is downloaded
+
+Each run gets fresh input, output and sealed directories. Results are printed (or written with
+--out) as JSON: wall time per run, the proof's own metrics.json and the Redis commands it sent,
+plus in-process timings of process_secured_data and compare_secured_data on the same data.
+Run with:
+
+    python -m benchmarks.bench_proof [--depth 10] [--list-size 500] [--repeat 3] [--out results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import redis
+
+from benchmarks.synthetic import add_proof_arguments, fake_services, make_wallet, wallet_address
+from my_proof import codec, hashing
+from my_proof.proof_of_uniqueness import compare_secured_data, process_secured_data
+from my_proof.uniqueness_index import history_key
+
+SCENARIOS = ["cold", "warm", "no_redis"]
+SIGNATURE = "benchmark-signature"
+JWT_SECRET = "benchmark-secret"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def unused_port():
+    """A localhost port with nothing listening, for the unreachable Redis."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def proof_env(workdir, validator_url, redis_port, file_id, extra=None):
+    """Environment for one `python -m my_proof` run with its own input, output and sealed dirs."""
+    env = dict(os.environ)
+    env.update({
+        "INPUT_DIR": os.path.join(workdir, "input"),
+        "OUTPUT_DIR": os.path.join(workdir, "output"),
+        "SEALED_DIR": os.path.join(workdir, "sealed"),
+        "VALIDATOR_BASE_API_URL": validator_url,
+        "JWT_SECRET_KEY": JWT_SECRET,
+        "SIGNATURE": SIGNATURE,
+        "FILE_ID": str(file_id),
+        "REDIS_HOST": "127.0.0.1",
+        "REDIS_PORT": str(redis_port),
+        "REDIS_PWD": "",
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")])),
+    })
+    env.update(extra or {})
+    return env
+
+def prepare_workdir(workdir, current):
+    for name in ("input", "output", "sealed"):
+        shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+        os.makedirs(os.path.join(workdir, name))
+    with open(os.path.join(workdir, "input", "input.json"), "w", encoding="utf-8") as f:
+        json.dump(current, f)
+
+def run_proof(env):
+    """
+    Run one proof in a subprocess.
+
+    :return: Wall time, exit code and the proof's results.json and metrics.json (None if missing)
+    """
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-m", "my_proof"], env=env, cwd=REPO_ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    def load(name):
+        path = os.path.join(env["OUTPUT_DIR"], name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    run = {"wall_seconds": round(wall, 4), "exit_code": completed.returncode, "results": load("results.json"),
+           "metrics": load("metrics.json")}
+    if completed.returncode:
+        run["stderr_tail"] = completed.stderr[-2000:]
+    return run
+
+
+def seed_redis(redis_port, file_ids, history, config):
+    """Store each earlier file's processed hashes under its fileId, as its own proof would have."""
+    client = redis.StrictRedis(host="127.0.0.1", port=redis_port)
+    pipeline = client.pipeline()
+    for file_id, document in zip(file_ids, history):
+        processed = process_secured_data(document["contributions"], config["hash_version"])
+        pipeline.set(history_key(file_id, config["hash_version"]),
+                     codec.encode(processed, config["history_codec"], config["history_compression"]))
+    pipeline.execute()
+
+
+def bench_functions(current, history, hash_version, repeat):
+    """In-process timings of hashing the current file and comparing it with the last earlier file."""
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            hashing.clear_memo()
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return round(min(timings), 6)
+
+    processed_curr = process_secured_data(current["contributions"], hash_version)
+    processed_old = [entry for document in history for entry in process_secured_data(document["contributions"], hash_version)]
+    return {
+        "process_secured_data_seconds": best(lambda: process_secured_data(current["contributions"], hash_version)),
+        "compare_secured_data_seconds": best(lambda: compare_secured_data(processed_curr, processed_old)),
+    }
+
+
+def summarize_runs(runs):
+    walls = [run["wall_seconds"] for run in runs]
+    return {"runs": len(runs), "failed": sum(1 for run in runs if run["exit_code"]),
+            "wall_min": min(walls), "wall_median": round(statistics.median(walls), 4), "wall_max": max(walls)}
+
+
+def run_benchmark(args):
+    types = args.types.split(",")
+    wallet = wallet_address(1)
+    current, history = make_wallet(wallet, types, args.list_size, args.depth, args.overlap, args.seed)
+    file_ids = [f"hist-{generation}" for generation in range(len(history))]
+    config = {"hash_version": args.hash_version, "history_codec": args.codec, "history_compression": "none"}
+    extra_env = {"HASH_VERSION": str(args.hash_version), "HISTORY_CODEC": args.codec,
+                 "UNIQUENESS_ENGINE": args.engine}
+
+    report = {
+        "benchmark": "bench_proof",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {"types": types, "list_size": args.list_size, "depth": args.depth, "overlap": args.overlap,
+                   "seed": args.seed, "repeat": args.repeat, "hash_version": args.hash_version,
+                   "codec": args.codec, "engine": args.engine, "api_delay": args.api_delay},
+        "functions": bench_functions(current, history, args.hash_version, args.repeat),
+        "scenarios": {},
+    }
+
+    with fake_services(SIGNATURE, args.api_delay, "bench-proof-") as (validator, fake_redis, workdir):
+        for file_id, document in zip(file_ids, history):
+            validator.add_file(wallet, file_id, document)
+
+        for scenario in args.scenarios.split(","):
+            runs = []
+            for attempt in range(args.repeat):
+                fake_redis.flushall()
+                redis_port = fake_redis.port
+                if scenario == "warm":
+                    seed_redis(redis_port, file_ids, history, config)
+                elif scenario == "no_redis":
+                    redis_port = unused_port()
+                fake_redis.reset_counts()
+                prepare_workdir(workdir, current)
+
+                run = run_proof(proof_env(workdir, validator.url, redis_port, f"current-{attempt}", extra_env))
+                run["redis_commands"] = dict(fake_redis.command_counts) if scenario != "no_redis" else {}
+                runs.append(run)
+            report["scenarios"][scenario] = {"summary": summarize_runs(runs), "runs": runs}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end proof benchmark against local stand-ins")
+    add_proof_arguments(parser, list_size=500, depth=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--engine", default="legacy")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = run_benchmark(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    failed = sum(scenario["summary"]["failed"] for scenario in report["scenarios"].values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
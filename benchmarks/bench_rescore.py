@@ -0,0 +1,120 @@
+"""
+Throughput and parity of the columnar re-scoring engine in my_proof.rescore.
+
+Generates --files synthetic scoring records: one to six contribution types per file, drawn from
+every type in the points table plus one that is not in it. Some types repeat, some witnesses are
+not from a valid domain, and unique entry counts span every tier of get_dynamic_task_score. A
+few files are broken the ways the scalar path fails on: a missing unique entry, no
+contributions or null witnesses. The whole set is re-scored with the columnar engine, and the first --verify
+files with Proof.calculate_individual_scores. Each path is timed best of --repeat runs, and the
+JSON report has files per second for both. It fails if any verified file differs or the columnar
+engine is less than --min-speedup times faster per file than the scalar path; both run on the
+same machine, so the check does not depend on how fast that machine is. --target-fps adds an
+absolute floor for a known machine. Run with:
+
+    python -m benchmarks.bench_rescore [--files 200000] [--verify 5000] [--min-speedup 2] [--target-fps 0]
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_proof import git_commit
+from my_proof.proof_of_quality import points
+from my_proof.rescore import rescore, score_record_scalar, verify_parity
+
+WITNESSES = ["wss://attestor.reclaimprotocol.org/ws", "https://reclaimprotocol.org/witness", "wss://example.org/ws"]
+BROKEN_EVERY = 997
+
+
+def make_records(count, seed=0):
+    rng = np.random.default_rng(seed)
+    types = list(points) + ["FACEBOOK"]
+    records = []
+    for position in range(count):
+        chosen = rng.choice(types, size=int(rng.integers(1, 7))).tolist()
+        contributions = [
+            {"type": task_type, "witnesses": WITNESSES[0] if rng.random() < 0.9 else str(rng.choice(WITNESSES))}
+            for task_type in chosen
+        ]
+        unique_entries = [
+            {"type": task_type, "unique_entry_count": int(rng.integers(0, 21)),
+             "type_unique_score": float(rng.integers(0, 5)) / 4}
+            for task_type in chosen
+        ]
+        if position % BROKEN_EVERY == 1:
+            unique_entries = unique_entries[1:]
+        elif position % BROKEN_EVERY == 2:
+            contributions = []
+        elif position % BROKEN_EVERY == 3:
+            contributions[0]["witnesses"] = None
+        records.append({"file_id": f"f{position}", "ownership": float(rng.random() < 0.95),
+                        "contributions": contributions, "unique_entries": unique_entries})
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--verify", type=int, default=5000, help="Files also scored on the scalar path")
+    parser.add_argument("--min-speedup", type=float, default=2.0,
+                        help="Minimum files per second of the columnar engine, as a multiple of the scalar path")
+    parser.add_argument("--target-fps", type=float, default=0, help="Minimum files per second of the columnar engine, 0 for none")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path, the fastest one counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    records = make_records(args.files, args.seed)
+    columnar_seconds = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        results = rescore(records)
+        columnar_seconds = min(columnar_seconds, time.perf_counter() - start)
+
+    verified = records[:args.verify]
+    logging.disable(logging.INFO)  # The scalar path logs every type of every file
+    scalar_seconds = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for record in verified:
+            try:
+                score_record_scalar(record)
+            except (KeyError, TypeError, ZeroDivisionError):
+                pass
+        scalar_seconds = min(scalar_seconds, time.perf_counter() - start)
+    mismatches = verify_parity(verified, results[:args.verify])
+    logging.disable(logging.NOTSET)
+
+    columnar_fps = len(records) / columnar_seconds if columnar_seconds else float("inf")
+    scalar_fps = len(verified) / scalar_seconds if scalar_seconds else None
+    speedup = columnar_fps / scalar_fps if scalar_fps else None
+    report = {
+        "benchmark": "bench_rescore",
+        "commit": git_commit(),
+        "params": {key: value for key, value in vars(args).items() if key != "out"},
+        "failed_files": sum(1 for line in results if "error" in line),
+        "columnar_files_per_second": round(columnar_fps),
+        "scalar_files_per_second": round(scalar_fps) if scalar_fps else None,
+        "speedup": round(speedup, 2) if speedup else None,
+        "mismatches": mismatches[:10],
+        "checks": {
+            "parity with the scalar path": not mismatches,
+            "speedup over the scalar path": speedup is None or speedup >= args.min_speedup,
+            "throughput": columnar_fps >= args.target_fps,
+        },
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0 if all(report["checks"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Checks of the proof result cache and its invalidation rules.
+
+The key checks change one input of result_cache_key at a time. Each must give a new key, except
+the ones documented not to matter: settings that do not affect scores, key order in the input,
+and the current file showing up in its own history. It then checks which results get stored, and
+expiry in both backends. Finally it runs full proofs against benchmarks.fake_validator:
+- a retry must return the identical results.json and download no history: it calls /api/userinfo
+  and the ownership check, which starts before the cache lookup;
+- a cache hit must still give the scoring record of the file, for my_proof.rescore;
+- a new earlier file for the wallet must make the next run recompute.
+
+Prints a JSON report and exits with 1 if any check fails:
+
+    python -m benchmarks.check_result_cache [--backend sealed|redis]
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import redis
+
+from benchmarks.bench_proof import SIGNATURE, prepare_workdir, proof_env, run_proof
+from benchmarks.fake_redis import FakeRedisServer
+from benchmarks.fake_validator import FakeValidator
+from benchmarks.synthetic import make_wallet, wallet_address
+from my_proof.__main__ import load_config
+from my_proof.metrics import metrics
+from my_proof.proof import Proof
+from my_proof.result_cache import RedisResultCache, SealedResultCache, is_cacheable, result_cache_key
+
+FILE_ID = "current-1"
+
+
+def key_checks(current, history_ids):
+    config = {'dlp_id': 24, 'hash_version': 1, 'uniqueness_engine': 'legacy', 'history_workers': 4}
+    file_list = [{"fileId": file_id, "fileUrl": f"https://storage/{file_id}.gpg"} for file_id in history_ids]
+    tables = Proof.scoring_tables()
+    base = result_cache_key(current, config, file_list, tables, FILE_ID)
+
+    def key(input_data=current, config=config, file_list=file_list, tables=tables, file_id=FILE_ID):
+        return result_cache_key(input_data, config, file_list, tables, file_id)
+
+    edited = copy.deepcopy(current)
+    edited["contributions"][0]["securedSharedData"]["followers"] += 1
+    reordered = {name: current[name] for name in reversed(list(current))}
+    other_points = copy.deepcopy(tables)
+    other_points['points'] = dict(tables['points'], UBER=tables['points'].get('UBER', 0) + 1)
+    other_domains = dict(tables, valid_domains=tables['valid_domains'] + ["example.org"])
+    with_current = file_list + [{"fileId": FILE_ID, "fileUrl": "https://storage/current.gpg"}]
+
+    return {
+        "same inputs give the same key": key() == base,
+        "edited input invalidates": key(input_data=edited) != base,
+        "other fileId invalidates": key(file_id="current-2") != base,
+        "points table change invalidates": key(tables=other_points) != base,
+        "valid domains change invalidates": key(tables=other_domains) != base,
+        "scoring setting change invalidates": key(config=dict(config, hash_version=2)) != base,
+        "uniqueness engine change invalidates": key(config=dict(config, uniqueness_engine='vectorized')) != base,
+        "new earlier file invalidates": key(file_list=file_list + [{"fileId": "new"}]) != base,
+        "removed earlier file invalidates": key(file_list=file_list[1:]) != base,
+        "non-scoring setting keeps the key": key(config=dict(config, history_workers=16)) == base,
+        "input key order keeps the key": key(input_data=reordered) == base,
+        "history order keeps the key": key(file_list=list(reversed(file_list))) == base,
+        "current file listed in its history keeps the key": key(file_list=with_current) == base,
+    }
+
+def cacheable_checks():
+    complete = {'ownership': 1.0, 'score': 0.5, 'attributes': {'history_coverage': {'failed': 0, 'deadline_reached': False}}}
+    return {
+        "complete result is stored": is_cacheable(complete),
+        "result without history coverage is not stored": not is_cacheable({'ownership': 1.0}),
+        "failed ownership is not stored": not is_cacheable(dict(complete, ownership=0.0)),
+        "failed history download is not stored": not is_cacheable(
+            dict(complete, attributes={'history_coverage': {'failed': 1, 'deadline_reached': False}})),
+        "history deadline hit is not stored": not is_cacheable(
+            dict(complete, attributes={'history_coverage': {'failed': 0, 'deadline_reached': True}})),
+    }
+
+def expiry_checks(root, redis_port):
+    sealed = SealedResultCache(os.path.join(root, "expiry"), ttl=60)
+    sealed.put("fresh", {"score": 1})
+    sealed.entries.put("stale", {"stored_at": time.time() - 61, "result": {"score": 1}})
+    client = redis.StrictRedis(host="127.0.0.1", port=redis_port)
+    RedisResultCache(client, ttl=60).put("key", {"score": 1})
+    ttl = client.ttl("uniq:proof:key")
+    return {
+        "sealed entry within TTL is returned": sealed.get("fresh") == {"score": 1},
+        "sealed entry past TTL is ignored": sealed.get("stale") is None,
+        "redis entry gets the TTL": 0 < ttl <= 60,
+    }
+
+def end_to_end_checks(root, backend, redis_port):
+    address = wallet_address(7)
+    current, history = make_wallet(address, list_size=50, depth=3)
+    with FakeValidator(SIGNATURE) as validator:
+        for generation, document in enumerate(history[:-1]):
+            validator.add_file(address, f"hist-{generation}", document)
+        workdir = os.path.join(root, "proof")
+        os.makedirs(workdir)
+        prepare_workdir(workdir, current)
+        env = proof_env(workdir, validator.url, redis_port, FILE_ID, {"RESULT_CACHE": backend})
+
+        first = run_proof(env)
+        validator.requests.clear()
+        retry = run_proof(env)
+        retry_requests = dict(validator.requests)
+        # A cache hit in process, as batch mode would see it, must still give the scoring record
+        with mock.patch.dict(os.environ, env):
+            # SEALED_DIR is read at import time, so it is set here
+            in_process = Proof(dict(load_config(), sealed_dir=env["SEALED_DIR"], use_sealing=True))
+            metrics.reset()
+            in_process.score_input(copy.deepcopy(current))
+            in_process_hit = metrics.summary().get("result_cache_hits")
+
+        validator.add_file(address, "hist-new", history[-1])
+        validator.requests.clear()
+        after_new_file = run_proof(env)
+        new_file_requests = dict(validator.requests)
+
+    counters = lambda run: (run.get("metrics") or {}).get("counters") or {}
+    return {
+        "first run succeeds": first["exit_code"] == 0 and counters(first).get("result_cache_misses") == 1,
+        "retry returns the same results.json": retry["results"] == first["results"],
+        "retry is served from the cache": counters(retry).get("result_cache_hits") == 1,
+        "retry downloads no history": set(retry_requests) <= {"/api/userinfo", "/api/datavalidation"}
+                                      and retry_requests.get("/api/userinfo") == 1,
+        "cache hit keeps the scoring record": in_process_hit == 1
+                                              and bool((in_process.last_scoring_record or {}).get("contributions")),
+        "new earlier file recomputes": counters(after_new_file).get("result_cache_misses") == 1
+                                       and "/files" in new_file_requests,
+    }, {"retry_requests": retry_requests, "after_new_file_requests": new_file_requests,
+        "wall_seconds": {"first": first["wall_seconds"], "retry": retry["wall_seconds"]}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backend", default="sealed", choices=["sealed", "redis"])
+    args = parser.parse_args()
+
+    address = wallet_address(7)
+    current, _ = make_wallet(address, list_size=20, depth=3)
+    with FakeRedisServer() as fake_redis, tempfile.TemporaryDirectory(prefix="result-cache-") as root:
+        checks = {}
+        checks.update(key_checks(current, ["hist-0", "hist-1", "hist-2"]))
+        checks.update(cacheable_checks())
+        checks.update(expiry_checks(root, fake_redis.port))
+        end_to_end, details = end_to_end_checks(root, args.backend, fake_redis.port)
+        checks.update(end_to_end)
+
+    report = {"benchmark": "check_result_cache", "backend": args.backend, "details": details, "checks": checks}
+    print(json.dumps(report, indent=2))
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+In-process Redis stand-in speaking RESP2 over TCP, for the benchmarks.
+
+Implements the commands the proof and redis-py's connection setup use (strings, sets, hashes,
+SCAN, expiry) on plain dicts behind one lock. Every command is counted, so benchmarks can report
+Redis traffic per run. It is a test double, not a Redis: no persistence, no eviction, and
+expired keys are dropped lazily when read.
+"""
+import fnmatch
+import socketserver
+import threading
+import time
+
+
+class RespError(Exception):
+    pass
+
+
+class FakeRedisServer:
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}
+        self.expires = {}  # key -> monotonic deadline
+        self.command_counts = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def reset_counts(self):
+        with self._lock:
+            self.command_counts = {}
+
+    def flushall(self):
+        with self._lock:
+            self.data.clear()
+            self.expires.clear()
+
+    # Storage helpers, called with the lock held
+
+    def _alive(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return key in self.data
+
+    def _get_set(self, key, create=False):
+        if not self._alive(key):
+            if not create:
+                return set()
+            self.data[key] = set()
+        value = self.data[key]
+        if not isinstance(value, set):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _get_hash(self, key, create=False):
+        if not self._alive(key):
+            if not create:
+                return {}
+            self.data[key] = {}
+        value = self.data[key]
+        if not isinstance(value, dict):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def count(self, name):
+        with self._lock:
+            self.command_counts[name] = self.command_counts.get(name, 0) + 1
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        args = args[1:]
+        self.count(name)
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise RespError(f"ERR unknown command '{name}'")
+        with self._lock:
+            return handler(*args)
+
+    def execute_transaction(self, commands):
+        """Run queued MULTI commands back to back under the lock, so no other client interleaves."""
+        replies = []
+        with self._lock:
+            for args in commands:
+                handler = getattr(self, f"cmd_{args[0].decode().lower()}", None)
+                try:
+                    replies.append(handler(*args[1:]) if handler else RespError("ERR unknown command"))
+                except RespError as error:
+                    replies.append(error)
+                except (TypeError, ValueError, IndexError) as error:
+                    replies.append(RespError(f"ERR {error}"))
+        return replies
+
+    # Commands
+
+    def cmd_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def cmd_auth(self, *args):
+        if self.password and args[-1].decode() != self.password:
+            raise RespError("WRONGPASS invalid password")
+        return "OK"
+
+    def cmd_select(self, *args):
+        return "OK"
+
+    def cmd_client(self, *args):
+        return "OK"
+
+    def cmd_get(self, key):
+        if not self._alive(key):
+            return None
+        value = self.data[key]
+        if isinstance(value, (set, dict)):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_mget(self, *keys):
+        return [self.data[key] if self._alive(key) and not isinstance(self.data[key], (set, dict)) else None for key in keys]
+
+    def cmd_set(self, key, value, *options):
+        options = [option.decode().upper() if isinstance(option, bytes) else option for option in options]
+        ttl = None
+        if "EX" in options:
+            ttl = float(options[options.index("EX") + 1])
+        elif "PX" in options:
+            ttl = float(options[options.index("PX") + 1]) / 1000
+        exists = self._alive(key)
+        if ("NX" in options and exists) or ("XX" in options and not exists):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if ttl is not None:
+            self.expires[key] = time.monotonic() + ttl
+        return "OK"
+
+    def cmd_setex(self, key, seconds, value):
+        return self.cmd_set(key, value, b"EX", seconds)
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return removed
+
+    cmd_unlink = cmd_del
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key))
+
+    def cmd_expire(self, key, seconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + float(seconds)
+        return 1
+
+    def cmd_ttl(self, key):
+        if not self._alive(key):
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else max(0, round(deadline - time.monotonic()))
+
+    def cmd_sadd(self, key, *members):
+        values = self._get_set(key, create=True)
+        before = len(values)
+        values.update(members)
+        return len(values) - before
+
+    def cmd_sismember(self, key, member):
+        return int(member in self._get_set(key))
+
+    def cmd_smismember(self, key, *members):
+        values = self._get_set(key)
+        return [int(member in values) for member in members]
+
+    def cmd_smembers(self, key):
+        return list(self._get_set(key))
+
+    def cmd_scard(self, key):
+        return len(self._get_set(key))
+
+    def cmd_srandmember(self, key, count=None):
+        values = self._get_set(key)
+        if count is None:
+            return next(iter(values), None)
+        return list(values)[:abs(int(count))]
+
+    def cmd_hset(self, key, *pairs):
+        values = self._get_hash(key, create=True)
+        before = len(values)
+        values.update(zip(pairs[::2], pairs[1::2]))
+        return len(values) - before
+
+    def cmd_hget(self, key, field):
+        return self._get_hash(key).get(field)
+
+    def cmd_hmget(self, key, *fields):
+        values = self._get_hash(key)
+        return [values.get(field) for field in fields]
+
+    def cmd_keys(self, pattern):
+        pattern = pattern.decode()
+        return [key for key in list(self.data) if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+
+    def cmd_scan(self, cursor, *options):
+        options = [option.decode() for option in options]
+        pattern = options[options.index("MATCH") + 1] if "MATCH" in options else "*"
+        count = int(options[options.index("COUNT") + 1]) if "COUNT" in options else 10
+        keys = sorted(self.data)
+        start = int(cursor)
+        batch = keys[start:start + count]
+        next_cursor = start + count if start + count < len(keys) else 0
+        matched = [key for key in batch if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+        return [str(next_cursor).encode(), matched]
+
+    def cmd_dbsize(self):
+        return sum(1 for key in list(self.data) if self._alive(key))
+
+    def cmd_flushall(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return "OK"
+
+    cmd_flushdb = cmd_flushall
+
+    # Server
+
+    def start(self):
+        store = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                queued = None  # Commands after MULTI, until EXEC or DISCARD
+                while True:
+                    try:
+                        args = read_command(self.rfile)
+                    except (ConnectionError, ValueError):
+                        return
+                    if args is None:
+                        return
+                    name = args[0].decode().upper()
+                    if name == "MULTI":
+                        store.count(name)
+                        queued = []
+                        self.wfile.write(encode_reply("OK"))
+                        continue
+                    if queued is not None and name not in ("EXEC", "DISCARD"):
+                        store.count(name)
+                        queued.append(args)
+                        self.wfile.write(encode_reply("QUEUED"))
+                        continue
+                    if name in ("EXEC", "DISCARD"):
+                        store.count(name)
+                        reply = store.execute_transaction(queued or []) if name == "EXEC" else "OK"
+                        queued = None
+                        self.wfile.write(encode_reply(reply))
+                        continue
+                    try:
+                        reply = store.execute(args)
+                    except RespError as error:
+                        reply = error
+                    except (TypeError, ValueError, IndexError) as error:
+                        reply = RespError(f"ERR {error}")
+                    self.wfile.write(encode_reply(reply))
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler, bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.server_bind()
+        self._server.server_activate()
+        threading.Thread(target=self._server.serve_forever, name="fake-redis", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def read_command(rfile):
+    """Read one command, as a RESP array of bulk strings or an inline command."""
+    line = rfile.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split() or read_command(rfile)
+    args = []
+    for _ in range(int(line[1:])):
+        header = rfile.readline()
+        if not header.startswith(b"$"):
+            raise ValueError("Expected a bulk string")
+        length = int(header[1:])
+        args.append(rfile.read(length + 2)[:-2])
+    return args
+
+def encode_reply(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, (bytes, bytearray)):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, (list, tuple, set)):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
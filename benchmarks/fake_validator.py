@@ -0,0 +1,115 @@
+"""
+Local stand-in for the validator API and the file storage behind it.
+
+Serves, on an ephemeral localhost port:
+
+    POST /api/userinfo        the wallet's earlier files as [{"fileId", "fileUrl"}]
+    POST /api/datavalidation  200 for every wallet
+    GET  /files/<fileId>.gpg  an earlier file, GPG encrypted with the proof signature
+
+Earlier files are encrypted once when added, every other one wrapped in a ZIP like real
+uploads. An optional delay is added to the API calls to mimic a remote validator.
+"""
+import io
+import json
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import gnupg
+
+
+def encrypt_document(document, passphrase, zipped=False, gpg=None):
+    """GPG-encrypt a JSON document symmetrically, the way contributions are uploaded."""
+    raw = json.dumps(document).encode()
+    if zipped:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("data/export.json", raw)
+        raw = buffer.getvalue()
+    encrypted = (gpg or gnupg.GPG()).encrypt(raw, recipients=None, symmetric="AES256", passphrase=passphrase, armor=False)
+    if not encrypted.ok:
+        raise RuntimeError(f"Encryption failed: {encrypted.stderr}")
+    return encrypted.data
+
+
+class FakeValidator:
+    def __init__(self, passphrase, api_delay=0.0):
+        self.passphrase = passphrase
+        self.api_delay = api_delay
+        self.files = {}  # fileId -> encrypted bytes
+        self.wallet_files = {}  # lowercased wallet -> [fileId]
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._gpg = gnupg.GPG()
+        self._server = None
+
+    def add_file(self, wallet_address, file_id, document):
+        encrypted = encrypt_document(document, self.passphrase, zipped=len(self.files) % 2 == 1, gpg=self._gpg)
+        with self._lock:
+            self.files[str(file_id)] = encrypted
+            self.wallet_files.setdefault(wallet_address.lower(), []).append(str(file_id))
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def start(self):
+        validator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+                validator.count(self.path)
+                time.sleep(validator.api_delay)
+                if self.path == "/api/userinfo":
+                    wallet = str(json.loads(body or b"{}").get("walletAddress", "")).lower()
+                    with validator._lock:
+                        file_ids = list(validator.wallet_files.get(wallet, []))
+                    files = [{"fileId": file_id, "fileUrl": f"{validator.url}/files/{file_id}.gpg"} for file_id in file_ids]
+                    return self._reply(200, json.dumps(files).encode())
+                if self.path == "/api/datavalidation":
+                    return self._reply(200, b'{"ok": true}')
+                self._reply(404, b'{"error": "not found"}')
+
+            def do_GET(self):
+                validator.count("/files")
+                file_id = self.path.rsplit("/", 1)[-1].removesuffix(".gpg")
+                with validator._lock:
+                    encrypted = validator.files.get(file_id)
+                if encrypted is None:
+                    return self._reply(404, b"")
+                self._reply(200, encrypted, "application/octet-stream")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-validator", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,107 @@
+"""
+Latency bounds of my_proof.http_client against a local fake validator.
+
+Starts an HTTP server on localhost whose handlers stall, fail or answer slowly on demand, then
+times the client against each behaviour. Run with:
+
+    python -m benchmarks.http_latency
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The client reads its settings at import time
+os.environ.setdefault('HTTP_CONNECT_TIMEOUT', '0.5')
+os.environ.setdefault('HTTP_READ_TIMEOUT', '0.5')
+os.environ.setdefault('HTTP_MAX_RETRIES', '2')
+os.environ.setdefault('HTTP_BACKOFF_BASE', '0.05')
+
+from my_proof import http_client  # noqa: E402
+
+
+class FakeValidatorHandler(BaseHTTPRequestHandler):
+    """
+    /ok answers at once, /hang never answers in time, /flaky fails twice with 503 then answers,
+    and /tail is slow on every other request, which is what hedging should hide.
+    """
+    calls = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _count(self):
+        with self.lock:
+            self.calls[self.path] = self.calls.get(self.path, 0) + 1
+            return self.calls[self.path]
+
+    def _reply(self, status=200, body=None):
+        payload = json.dumps(body or {"ok": True}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        call = self._count()
+        if self.path == "/hang":
+            time.sleep(5)
+        elif self.path == "/flaky" and call <= 2:
+            return self._reply(503)
+        elif self.path == "/tail" and call % 2 == 1:
+            time.sleep(1.0)
+        self._reply()
+
+    do_POST = do_GET
+
+
+def timed(label, fn, results):
+    start = time.perf_counter()
+    try:
+        outcome = fn().status_code
+    except Exception as error:
+        outcome = type(error).__name__
+    elapsed = time.perf_counter() - start
+    results.append({"case": label, "outcome": outcome, "seconds": round(elapsed, 3)})
+    return elapsed
+
+
+def run():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeValidatorHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    results = []
+    read_bound = http_client.READ_TIMEOUT * (http_client.MAX_RETRIES + 1) + http_client.BACKOFF_MAX
+    checks = []
+
+    timed("warm-up", lambda: http_client.get(f"{base}/ok"), results)
+    elapsed = timed("keep-alive GET", lambda: http_client.get(f"{base}/ok"), results)
+    checks.append(("keep-alive GET under 50ms", elapsed < 0.05))
+
+    elapsed = timed("hanging POST (not retried)", lambda: http_client.post(f"{base}/hang"), results)
+    checks.append(("non-idempotent hang bounded by one read timeout", elapsed < http_client.READ_TIMEOUT + 0.25))
+
+    elapsed = timed("hanging GET (retried)", lambda: http_client.get(f"{base}/hang"), results)
+    checks.append(("idempotent hang bounded by retries", elapsed < read_bound))
+
+    timed("flaky GET (503, 503, 200)", lambda: http_client.get(f"{base}/flaky"), results)
+    checks.append(("flaky GET recovers", results[-1]["outcome"] == 200))
+
+    slow = [timed("tail GET", lambda: http_client.get(f"{base}/tail", timeout=(0.5, 2)), results) for _ in range(4)]
+    hedged = [
+        timed("tail GET hedged at 0.1s", lambda: http_client.get(f"{base}/tail", timeout=(0.5, 2), hedge_after=0.1), results)
+        for _ in range(4)
+    ]
+    checks.append(("hedging cuts the slow tail", max(hedged) < max(slow) / 2))
+
+    server.shutdown()
+    print(json.dumps({"results": results, "checks": dict(checks)}, indent=2))
+    return all(passed for _, passed in checks)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
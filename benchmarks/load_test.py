@@ -0,0 +1,143 @@
+"""
+Load harness: many concurrent proof jobs against one shared Redis and validator.
+
+Runs --jobs executions of `python -m my_proof`, at most --concurrency at a time, each in its own
+process and directories with its own FILE_ID. Jobs are spread over --wallets synthetic wallets,
+so several jobs of the same wallet contend for the same history. All jobs share one
+benchmarks.fake_redis server and one benchmarks.fake_validator, which is where production
+contention comes from. The JSON report has throughput, latency percentiles, the Redis hit ratio
+over history lookups, Redis command counts and validator request counts. Run with:
+
+    python -m benchmarks.load_test [--jobs 40] [--concurrency 8] [--wallets 5] [--out load.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_proof import SIGNATURE, git_commit, prepare_workdir, proof_env, run_proof, seed_redis
+from benchmarks.synthetic import add_proof_arguments, fake_services, make_wallet, wallet_address
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def build_wallets(args):
+    """:return: [(wallet address, [(fileId, earlier document)])] for every wallet"""
+    types = args.types.split(",")
+    wallets = []
+    for index in range(args.wallets):
+        address = wallet_address(index + 1)
+        _, history = make_wallet(address, types, args.list_size, args.depth, args.overlap, args.seed)
+        wallets.append((address, [(f"w{index}-hist-{generation}", document) for generation, document in enumerate(history)]))
+    return wallets
+
+def job_input(args, address, job):
+    """A current file for the job: the wallet's next export, varied per job."""
+    current, _ = make_wallet(address, args.types.split(","), args.list_size, args.depth, args.overlap, args.seed + job + 1)
+    return current
+
+
+def run_load(args):
+    wallets = build_wallets(args)
+    extra_env = {"HASH_VERSION": str(args.hash_version), "HISTORY_CODEC": args.codec,
+                 "UNIQUENESS_MODE": args.mode, "UNIQUENESS_ENGINE": args.engine}
+    extra_env.update(dict(item.split("=", 1) for item in args.env))
+    config = {"hash_version": args.hash_version, "history_codec": args.codec, "history_compression": "none"}
+
+    with fake_services(SIGNATURE, args.api_delay, "load-test-") as (validator, fake_redis, root):
+        for address, files in wallets:
+            for file_id, document in files:
+                validator.add_file(address, file_id, document)
+            if args.seed_redis:
+                seeded = files[:int(len(files) * args.seed_redis)]
+                seed_redis(fake_redis.port, [file_id for file_id, _ in seeded], [document for _, document in seeded], config)
+        fake_redis.reset_counts()
+
+        def job(index):
+            address, _ = wallets[index % len(wallets)]
+            workdir = os.path.join(root, f"job-{index}")
+            os.makedirs(workdir)
+            prepare_workdir(workdir, job_input(args, address, index))
+            run = run_proof(proof_env(workdir, validator.url, fake_redis.port, f"job-{index}", extra_env))
+            run["job"] = index
+            run["wallet"] = address
+            return run
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            runs = list(executor.map(job, range(args.jobs)))
+        elapsed = time.perf_counter() - start
+
+        redis_commands = dict(fake_redis.command_counts)
+        validator_requests = dict(validator.requests)
+
+    latencies = [run["wall_seconds"] for run in runs]
+    counters = {}
+    for run in runs:
+        for name, value in ((run.get("metrics") or {}).get("counters") or {}).items():
+            counters[name] = counters.get(name, 0) + value
+    lookups = counters.get("redis_hits", 0) + counters.get("redis_misses", 0)
+
+    return {
+        "benchmark": "load_test",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key != "out"},
+        "summary": {
+            "jobs": len(runs),
+            "failed": sum(1 for run in runs if run["exit_code"]),
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_jobs_per_second": round(len(runs) / elapsed, 3) if elapsed else None,
+            "latency_seconds": {
+                "p50": percentile(latencies, 0.50), "p90": percentile(latencies, 0.90),
+                "p99": percentile(latencies, 0.99), "max": max(latencies) if latencies else None,
+            },
+            "redis_hit_ratio": round(counters.get("redis_hits", 0) / lookups, 4) if lookups else None,
+            "redis_commands": redis_commands,
+            "redis_commands_total": sum(redis_commands.values()),
+            "validator_requests": validator_requests,
+            "counters": counters,
+        },
+        "runs": [
+            {key: run.get(key) for key in ("job", "wallet", "wall_seconds", "exit_code", "stderr_tail")}
+            | {"score": (run.get("results") or {}).get("score"), "stages": (run.get("metrics") or {}).get("stages")}
+            for run in runs
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent proof jobs against a shared Redis and validator")
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--wallets", type=int, default=5)
+    add_proof_arguments(parser)
+    parser.add_argument("--seed-redis", type=float, default=0.0,
+                        help="Fraction of each wallet's earlier files stored in Redis before the run")
+    parser.add_argument("--mode", default="blob", choices=["blob", "index"])
+    parser.add_argument("--engine", default="legacy", choices=["legacy", "vectorized"])
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for every job, may be repeated")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = run_load(args)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if report["summary"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
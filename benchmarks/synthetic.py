@@ -0,0 +1,127 @@
+"""
+Synthetic contributors for the benchmarks.
+
+A wallet gets one current input.json and `depth` earlier files. Every contribution type holds a
+list of `list_size` order-like records plus a profile dict and a few scalars, the shapes
+process_secured_data meets in real exports. Records are drawn from a per-wallet pool, so earlier
+files overlap with each other and with the current file by roughly `overlap`, as repeated exports
+of the same account do. Output is deterministic for a given seed. Write a wallet to disk with:
+
+    python -m benchmarks.synthetic --out /tmp/wallet [--types UBER,TWITCH] [--list-size 500] [--depth 10]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+
+from benchmarks.fake_redis import FakeRedisServer
+from benchmarks.fake_validator import FakeValidator
+from my_proof import codec, hashing
+from my_proof.proof_of_quality import points
+
+DEFAULT_TYPES = ["UBER", "TWITCH", "REDDIT"]
+WITNESS = "wss://attestor.reclaimprotocol.org/ws0x244897572368eadf65bfbc5aec98d8e5443a9072"
+
+
+def make_record(rng, index):
+    return {
+        "id": f"R{index:09d}",
+        "amount": round(rng.uniform(1, 250), 2),
+        "status": rng.choice(["completed", "cancelled", "refunded"]),
+        "items": [rng.choice(["a", "b", "c", "d", "e"]) for _ in range(rng.randint(1, 4))],
+        "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+    }
+
+def make_contribution(task_type, records, rng, wallet_address):
+    return {
+        "type": task_type,
+        "claimedDate": "2025-02-11T06:06:58.001Z",
+        "witnesses": WITNESS,
+        "walletAddress": wallet_address,
+        "securedSharedData": {
+            "username": f"user-{wallet_address[-6:]}",
+            "followers": rng.randint(0, 5000),
+            "orders": records,
+            "profile": {"city": rng.choice(["Pune", "Lisbon", "Austin"]), "verified": True, "tier": rng.randint(1, 3)},
+        },
+    }
+
+def make_wallet(wallet_address, types=None, list_size=200, depth=5, overlap=0.5, seed=0):
+    """
+    :return: (current input, [earlier inputs]) as input.json style dicts
+    """
+    types = types or DEFAULT_TYPES
+    rng = random.Random(f"{wallet_address}:{seed}")
+    fresh = max(1, int(list_size * (1 - overlap)))
+    pools = {task_type: [make_record(rng, i) for i in range(list_size + fresh * depth)] for task_type in types}
+
+    def make_file(generation):
+        # Each export starts `fresh` records later, so consecutive exports share the rest
+        contributions = []
+        for task_type in types:
+            start = fresh * generation
+            contributions.append(make_contribution(task_type, pools[task_type][start:start + list_size], rng, wallet_address))
+        return {"walletAddress": wallet_address, "claimDate": "2025-02-12T06:37:35.936Z", "contributions": contributions}
+
+    history = [make_file(generation) for generation in range(depth)]
+    return make_file(depth), history
+
+def wallet_address(index):
+    return "0x" + f"{index:040x}"
+
+
+def write_wallet(directory, current, history):
+    os.makedirs(os.path.join(directory, "history"), exist_ok=True)
+    with open(os.path.join(directory, "input.json"), "w", encoding="utf-8") as f:
+        json.dump(current, f)
+    for generation, earlier in enumerate(history):
+        with open(os.path.join(directory, "history", f"{generation}.json"), "w", encoding="utf-8") as f:
+            json.dump(earlier, f)
+
+
+def add_wallet_arguments(parser, list_size=200, depth=5):
+    """The make_wallet parameters as command line options."""
+    parser.add_argument("--types", default=",".join(DEFAULT_TYPES))
+    parser.add_argument("--list-size", type=int, default=list_size)
+    parser.add_argument("--depth", type=int, default=depth)
+    parser.add_argument("--overlap", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+
+def add_proof_arguments(parser, list_size=200, depth=5):
+    """The wallet options plus the settings of proof runs against fake_services."""
+    add_wallet_arguments(parser, list_size, depth)
+    parser.add_argument("--hash-version", type=int, default=hashing.HASH_VERSION_LEGACY)
+    parser.add_argument("--codec", default=codec.CODEC_JSON)
+    parser.add_argument("--api-delay", type=float, default=0.0, help="Seconds added to every validator API call")
+
+
+@contextlib.contextmanager
+def fake_services(signature, api_delay=0.0, prefix="proof-"):
+    """
+    A fake validator, a fake Redis and a scratch directory for proof runs, all removed on exit.
+
+    :return: (validator, fake_redis, directory) as a context manager
+    """
+    with FakeValidator(signature, api_delay=api_delay) as validator, FakeRedisServer() as fake_redis, \
+            tempfile.TemporaryDirectory(prefix=prefix) as directory:
+        yield validator, fake_redis, directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--wallet", type=int, default=1)
+    add_wallet_arguments(parser)
+    args = parser.parse_args()
+    types = args.types.split(",")
+    unknown = [task_type for task_type in types if task_type not in points]
+    if unknown:
+        parser.error(f"unknown contribution types: {', '.join(unknown)}")
+    current, history = make_wallet(wallet_address(args.wallet), types, args.list_size, args.depth, args.overlap, args.seed)
+    write_wallet(args.out, current, history)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,20 @@ import logging
 import os
 import sys
 import traceback
-import zipfile
 from typing import Dict, Any
+from my_proof.log_utils import configure_logging, lazy, payload, redact_config
+from my_proof.metrics import metrics
 from my_proof.proof import Proof
 
 # Default to 'production' if NODE_ENV is not set
 environment = os.environ.get('NODE_ENV', 'production')
 
-# Set the input and output directories based on the environment
-INPUT_DIR = './demo/input' if environment == 'development' else '/input'
-OUTPUT_DIR = './demo/output' if environment == 'development' else '/output'
-SEALED_DIR = './demo/sealed' if environment == 'development' else '/sealed'
+# Set the input and output directories based on the environment, unless given explicitly
+INPUT_DIR = os.environ.get('INPUT_DIR') or ('./demo/input' if environment == 'development' else '/input')
+OUTPUT_DIR = os.environ.get('OUTPUT_DIR') or ('./demo/output' if environment == 'development' else '/output')
+SEALED_DIR = os.environ.get('SEALED_DIR') or ('./demo/sealed' if environment == 'development' else '/sealed')
 
-logging.basicConfig(level=logging.INFO, format='%(message)s')
+configure_logging()
 
 def load_config() -> Dict[str, Any]:
     """Load proof configuration from environment variables."""
@@ -30,20 +31,40 @@ def load_config() -> Dict[str, Any]:
         'redis_port': os.environ.get('REDIS_PORT', None),
         'redis_host': os.environ.get('REDIS_HOST', None),
         'redis_pwd': os.environ.get('REDIS_PWD', None),
-        'use_sealing': os.path.isdir(SEALED_DIR)
+        'redis_writeback': os.environ.get('REDIS_WRITEBACK', 'true').lower() == 'true',
+        'redis_history_ttl': int(os.environ.get('REDIS_HISTORY_TTL', 0)),  # Seconds, 0 = no expiry
+        'history_workers': int(os.environ.get('HISTORY_WORKERS', 4)),
+        'hash_version': int(os.environ.get('HASH_VERSION', 1)),  # 1 = SHA-256 (legacy), 2 = BLAKE2b-128
+        'history_codec': os.environ.get('HISTORY_CODEC', 'json'),  # 'json' or 'compact'
+        'history_compression': os.environ.get('HISTORY_COMPRESSION', 'none'),  # 'none', 'zlib' or 'lz4'
+        'uniqueness_engine': os.environ.get('UNIQUENESS_ENGINE', 'legacy'),  # 'legacy' or 'vectorized'
+        'uniqueness_mode': os.environ.get('UNIQUENESS_MODE', 'blob'),  # 'blob' or 'index'
+        'uniqueness_global_index': os.environ.get('UNIQUENESS_GLOBAL_INDEX', 'false').lower() == 'true',
+        'near_duplicate_index': os.environ.get('NEAR_DUPLICATE_INDEX', 'none'),  # 'none', 'local' or 'redis'
+        'near_duplicate_threshold': float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.5)),
+        'near_duplicate_top_k': int(os.environ.get('NEAR_DUPLICATE_TOP_K', 5)),
+        'result_cache': os.environ.get('RESULT_CACHE', 'none'),  # 'none', 'redis' or 'sealed'
+        'result_cache_ttl': int(os.environ.get('RESULT_CACHE_TTL', 24 * 60 * 60)),
+        'history_deadline': float(os.environ.get('HISTORY_DEADLINE', 0)),  # Seconds after start, 0 = none
+        'lazy_scoring': os.environ.get('LAZY_SCORING', 'false').lower() == 'true',
+        'score_tolerance': float(os.environ.get('SCORE_TOLERANCE', 0.0)),
+        'use_sealing': os.path.isdir(SEALED_DIR),
+        'sealed_dir': SEALED_DIR,
+        'history_cache_max_bytes': int(os.environ.get('HISTORY_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+        'metrics_in_attributes': os.environ.get('METRICS_IN_ATTRIBUTES', 'false').lower() == 'true',
     }
-    logging.info(f"Using config: {json.dumps(config, indent=2)}")
+    logging.info("Using config: %s", lazy(json.dumps, redact_config(config), indent=2))
     return config
 
 
 def run() -> None:
     """Generate proofs for all input files."""
+    metrics.reset()
     config = load_config()
     input_files_exist = os.path.isdir(INPUT_DIR) and bool(os.listdir(INPUT_DIR))
 
     if not input_files_exist:
         raise FileNotFoundError(f"No input files found in {INPUT_DIR}")
-    extract_input()
 
     proof = Proof(config)
     proof_response = proof.generate()
@@ -51,25 +72,19 @@ def run() -> None:
     output_path = os.path.join(OUTPUT_DIR, "results.json")
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(proof_response, f, indent=2)
-    logging.info(f"Proof generation complete: {proof_response}")
-
-
-def extract_input() -> None:
-    """
-    If the input directory contains any zip files, extract them
-    :return:
-    """
-    for input_filename in os.listdir(INPUT_DIR):
-        input_file = os.path.join(INPUT_DIR, input_filename)
-
-        if zipfile.is_zipfile(input_file):
-            with zipfile.ZipFile(input_file, 'r') as zip_ref:
-                zip_ref.extractall(INPUT_DIR)
+    # Sidecar with the full per-stage metrics, kept out of results.json
+    metrics.write(os.path.join(OUTPUT_DIR, "metrics.json"))
+    logging.info("Proof generation complete: %s", payload(proof_response))
 
 
 if __name__ == "__main__":
     try:
-        run()
+        if os.environ.get('PROFILE'):
+            # Imported only when asked for, so a normal run does not load or hook the profilers
+            from my_proof.profiling import run_profiled
+            run_profiled(run, OUTPUT_DIR)
+        else:
+            run()
     except Exception as e:
         logging.error(f"Error during proof generation: {e}")
         traceback.print_exc()
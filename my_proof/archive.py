@@ -0,0 +1,202 @@
+"""
+Reading JSON documents from input files and ZIP archives without extracting them.
+
+JSON members are decompressed and parsed straight from the archive. Before anything is
+decompressed, an archive is checked against ARCHIVE_MAX_MEMBERS and its JSON members'
+uncompressed sizes against ARCHIVE_MAX_BYTES, so a zip bomb is rejected up front. zipfile
+stops reading a member at its declared size, so a member cannot decompress to more than the size
+that was checked.
+
+JsonStream reads a document one value at a time, so a large history file can be processed
+without building the whole document in memory, see proof_of_uniqueness.process_secured_file.
+"""
+import io
+import json
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+
+ARCHIVE_MAX_MEMBERS = int(os.environ.get('ARCHIVE_MAX_MEMBERS', 10000))
+ARCHIVE_MAX_BYTES = int(os.environ.get('ARCHIVE_MAX_BYTES', 512 * 1024 * 1024))
+STREAM_CHUNK_SIZE = 64 * 1024  # Characters read at a time by JsonStream
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+
+class ArchiveLimitError(ValueError):
+    """An archive has too many members or would decompress to too many bytes."""
+
+
+def is_json_member(member: zipfile.ZipInfo) -> bool:
+    # Skip the resource forks macOS adds next to every file
+    return (not member.is_dir() and member.filename.lower().endswith(".json")
+            and not member.filename.startswith("__MACOSX/"))
+
+def json_members(zip_ref: zipfile.ZipFile, max_members=None, max_bytes=None):
+    """
+    List an archive's JSON members after checking the archive against the limits.
+
+    :return: The JSON members in archive order
+    """
+    max_members = ARCHIVE_MAX_MEMBERS if max_members is None else max_members
+    max_bytes = ARCHIVE_MAX_BYTES if max_bytes is None else max_bytes
+    members = zip_ref.infolist()
+    if len(members) > max_members:
+        raise ArchiveLimitError(f"Archive has {len(members)} members, the limit is {max_members}")
+    selected = [member for member in members if is_json_member(member)]
+    total = sum(member.file_size for member in selected)
+    if total > max_bytes:
+        raise ArchiveLimitError(f"Archive JSON members decompress to {total} bytes, the limit is {max_bytes}")
+    return selected
+
+def iter_json_members(path):
+    """:return: Generator of (member name, parsed JSON) for every JSON member of the archive at path"""
+    with zipfile.ZipFile(path, 'r') as zip_ref:
+        for member in json_members(zip_ref):
+            with zip_ref.open(member) as json_file:
+                yield member.filename, json.load(json_file)
+
+
+@contextmanager
+def open_json_document(path):
+    """Open a JSON file, or the first JSON member of a ZIP archive, as a text stream."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path, 'r') as zip_ref:
+            members = json_members(zip_ref)
+            if not members:
+                raise Exception("No JSON file found inside the ZIP")
+            with zip_ref.open(members[0]) as json_file:
+                yield io.TextIOWrapper(json_file, encoding='utf-8-sig')
+        return
+
+    with open(path, 'r', encoding='utf-8-sig') as json_file:
+        yield json_file
+
+
+class JsonStream:
+    """
+    Pull parser over a text stream.
+
+    Containers are walked with iter_object and iter_array, which yield once per key or element
+    and leave its value to the caller: value() decodes it whole, or the caller walks into it.
+    Only the value being decoded is held, so memory depends on the largest single value decoded,
+    not on the document. Values are decoded with json's own scanner, reading more of the stream
+    whenever the buffer ends inside one.
+    """
+
+    def __init__(self, stream, chunk_size=STREAM_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Read more of the stream, at least as much as is buffered, so retried decodes stay linear."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """:return: The next non-whitespace character, or "" at the end of the stream"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}, found {found!r}", self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value whole."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number cut off by the end of the buffer may go on in the next chunk
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and _NUMBER_TAIL.fullmatch(self.buffer, end) and self._fill()):
+                continue
+            self.pos = end
+            return value
+
+    def iter_object(self):
+        """Walk an object: yields each key, and the caller consumes its value before the next one."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise json.JSONDecodeError("Expecting property name", self.buffer, self.pos)
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+    def iter_array(self):
+        """Walk an array: yields once per element, and the caller consumes the element."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+    def end(self):
+        """Check that nothing but whitespace follows the document, as json.load does."""
+        if self.peek():
+            raise json.JSONDecodeError("Extra data", self.buffer, self.pos)
+
+def iter_input_file(path):
+    """
+    Yield every input document of one file: the file itself, or each JSON member of a ZIP.
+
+    :return: Generator of (member name, or None for a plain JSON file, parsed JSON)
+    """
+    if zipfile.is_zipfile(path):
+        yield from iter_json_members(path)
+        return
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        yield None, json.load(f)
+
+def iter_input_documents(input_dir):
+    """
+    Yield every input document in input_dir: each .json file and each JSON member of each ZIP.
+
+    :return: Generator of (name, parsed JSON); names of archive members are "<archive>/<member>"
+    """
+    for input_filename in sorted(os.listdir(input_dir)):
+        input_file = os.path.join(input_dir, input_filename)
+        if not os.path.isfile(input_file):
+            continue
+        if os.path.splitext(input_filename)[1].lower() == '.json' or zipfile.is_zipfile(input_file):
+            for member_name, document in iter_input_file(input_file):
+                yield (f"{input_filename}/{member_name}" if member_name else input_filename), document
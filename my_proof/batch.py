@@ -0,0 +1,144 @@
+"""
+Batch mode: score many input files in one invocation.
+
+Every .json file in the input directory is scored on its own, with a fresh response, across a
+pool of worker processes. Each worker keeps its Redis client and HTTP session for all the files
+it scores. Results are written as JSON lines, one per input file in input order, and/or as one
+<name>.json per input file in a results directory:
+
+    python -m my_proof.batch --input DIR [--output results.jsonl] [--results-dir DIR] [--workers N]
+
+The fileId of a file is its name without extension and the signature is SIGNATURE, unless a
+JSONL manifest of {"input": <file name>, "file_id": ..., "signature": ...} lines says otherwise.
+Other settings come from the same environment variables as a single proof run.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from my_proof.__main__ import load_config
+from my_proof.log_utils import configure_logging
+from my_proof.metrics import metrics
+from my_proof.proof import Proof
+
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 0)) or os.cpu_count() or 1
+
+_worker_config = None
+
+
+def list_inputs(input_dir):
+    """:return: Sorted paths of the .json files in input_dir"""
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if os.path.splitext(name)[1].lower() == '.json' and os.path.isfile(os.path.join(input_dir, name))
+    )
+
+def load_manifest(path):
+    """:return: {input file name: {"file_id": ..., "signature": ...}}"""
+    manifest = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                manifest[os.path.basename(entry['input'])] = entry
+    return manifest
+
+def make_jobs(paths, manifest=None):
+    jobs = []
+    for path in paths:
+        name = os.path.basename(path)
+        entry = (manifest or {}).get(name, {})
+        jobs.append((path, entry.get('file_id') or os.path.splitext(name)[0], entry.get('signature')))
+    return jobs
+
+
+def _init_worker(config):
+    global _worker_config
+    configure_logging()
+    _worker_config = config
+
+def score_file(job):
+    """
+    Score one input file in a worker process.
+
+    :return: {"file", "file_id", "result", "metrics", "scoring_record"}, or {"file", "file_id", "error"} if scoring failed
+    """
+    path, file_id, signature = job
+    name = os.path.basename(path)
+    metrics.reset()
+    config = dict(_worker_config, file_id=file_id, input_dir=os.path.dirname(path))
+    if signature:
+        config['signature'] = signature
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            input_data = json.load(f)
+        logging.info(f"Processing file: {name}")
+        proof = Proof(config)
+        result = proof.score_input(input_data)
+        if config.get('metrics_in_attributes'):
+            result.setdefault('attributes', {})['metrics'] = metrics.summary()
+        line = {"file": name, "file_id": file_id, "result": result, "metrics": metrics.summary()}
+        if proof.last_scoring_record is not None:
+            # Lets my_proof.rescore recompute the scores later without the validator or Redis
+            line["scoring_record"] = proof.last_scoring_record
+        return line
+    except Exception as error:
+        logging.error(f"Error scoring {name}: {error}")
+        return {"file": name, "file_id": file_id, "error": str(error)}
+
+
+def run_batch(config, jobs, output=None, results_dir=None, workers=BATCH_WORKERS):
+    """
+    Score jobs across a process pool and write each result as soon as it is in order.
+
+    :return: (files scored, files failed)
+    """
+    if results_dir:
+        os.makedirs(results_dir, exist_ok=True)
+    scored = failed = 0
+    out = open(output, 'w', encoding='utf-8') if output else None
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs) or 1)), initializer=_init_worker,
+                                 initargs=(config,)) as executor:
+            for line in executor.map(score_file, jobs):
+                if 'error' in line:
+                    failed += 1
+                else:
+                    scored += 1
+                    if results_dir:
+                        result_path = os.path.join(results_dir, f"{os.path.splitext(line['file'])[0]}.json")
+                        with open(result_path, 'w', encoding='utf-8') as f:
+                            json.dump(line['result'], f, indent=2)
+                if out:
+                    out.write(json.dumps(line) + "\n")
+                    out.flush()
+    finally:
+        if out:
+            out.close()
+    logging.info(f"Batch complete: {scored} files scored, {failed} failed")
+    return scored, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every .json input file of a directory")
+    parser.add_argument('--input', required=True, help="Directory of input .json files")
+    parser.add_argument('--output', help="JSON lines file with one result per input file")
+    parser.add_argument('--results-dir', help="Directory for one <name>.json result per input file")
+    parser.add_argument('--manifest', help="JSON lines of {input, file_id, signature} per input file")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    args = parser.parse_args()
+    if not args.output and not args.results_dir:
+        parser.error("give --output, --results-dir or both")
+
+    jobs = make_jobs(list_inputs(args.input), load_manifest(args.manifest) if args.manifest else None)
+    if not jobs:
+        raise FileNotFoundError(f"No input files found in {args.input}")
+    _, failed = run_batch(load_config(), jobs, args.output, args.results_dir, args.workers)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
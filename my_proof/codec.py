@@ -0,0 +1,220 @@
+"""
+Storage encoding of processed contributions, the output of process_secured_data.
+
+Two formats are understood by decode():
+
+- Legacy JSON, as written by json.dumps: nested dicts of hex digest strings.
+- Compact binary, version 1. Field names, dict keys and contribution types go into a string
+  table and are referenced by id; digests are packed as raw bytes of a fixed width.
+
+    header  b"PCH" | format version (1 byte) | compression (1 byte) | digest width (1 byte)
+    body    varint string count, then per string: varint length + UTF-8 bytes
+            varint entry count, then per entry:
+                varint type id (string id + 1, 0 for no type)
+                varint field count, then per field:
+                    varint name id, tag (1 byte)
+                    TAG_STR:  digest
+                    TAG_LIST: varint count, digests
+                    TAG_DICT: varint count, (varint key id, digest) pairs
+
+The body may be compressed with zlib, or with lz4 when the lz4 package is installed.
+
+The compact format is experimental. It halves the stored size, but decoding still creates one
+hex string per digest, so it is no faster than json.loads; compression gains nothing on digests.
+JSON stays the default.
+"""
+import json
+import zlib
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # lz4 is optional
+    lz4_frame = None
+
+MAGIC = b"PCH"
+FORMAT_VERSION = 1
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+COMPRESSIONS = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "lz4": COMPRESSION_LZ4}
+
+TAG_STR = 0
+TAG_LIST = 1
+TAG_DICT = 2
+
+CODEC_JSON = "json"
+CODEC_COMPACT = "compact"
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos: int):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _digest_width(processed) -> int:
+    """Common byte width of every digest in processed, or 0 if they are not uniform hex strings."""
+    width = None
+    for entry in processed:
+        for value in (entry.get("securedSharedData") or {}).values():
+            digests = value.values() if isinstance(value, dict) else value if isinstance(value, list) else [value]
+            for digest in digests:
+                if not isinstance(digest, str) or len(digest) % 2:
+                    return 0
+                if width is None:
+                    width = len(digest) // 2
+                elif len(digest) != width * 2:
+                    return 0
+    return width or 32
+
+
+def _compress(body: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(body, 6)
+    if compression == COMPRESSION_LZ4:
+        return lz4_frame.compress(body)
+    return body
+
+def _decompress(body, compression: int) -> bytes:
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(body)
+    if compression == COMPRESSION_LZ4:
+        if lz4_frame is None:
+            raise ValueError("Value is lz4 compressed but the lz4 package is not installed")
+        return lz4_frame.decompress(body)
+    if compression != COMPRESSION_NONE:
+        raise ValueError(f"Unknown compression: {compression}")
+    return body
+
+
+def encode_compact(processed, compression: str = "none") -> bytes:
+    """
+    Encode processed contributions in the compact binary format.
+
+    Falls back to legacy JSON if the digests are not hex strings of one common width.
+    """
+    compression_id = COMPRESSIONS[compression]
+    if compression_id == COMPRESSION_LZ4 and lz4_frame is None:
+        compression_id = COMPRESSION_ZLIB
+    width = _digest_width(processed)
+    if not width or width > 0xFF:
+        return json.dumps(processed).encode()
+
+    try:
+        body = _encode_body(processed, width)
+    except ValueError:  # Digests that are not hex
+        return json.dumps(processed).encode()
+    return MAGIC + bytes([FORMAT_VERSION, compression_id, width]) + _compress(body, compression_id)
+
+
+def _encode_body(processed, width: int) -> bytes:
+    strings = {}
+    def string_id(text):
+        if text not in strings:
+            strings[text] = len(strings)
+        return strings[text]
+
+    entries = bytearray()
+    _write_varint(entries, len(processed))
+    for entry in processed:
+        task_type = entry.get("type")
+        _write_varint(entries, 0 if task_type is None else string_id(str(task_type)) + 1)
+        secured_data = entry.get("securedSharedData") or {}
+        _write_varint(entries, len(secured_data))
+        for name, value in secured_data.items():
+            _write_varint(entries, string_id(name))
+            if isinstance(value, dict):
+                entries.append(TAG_DICT)
+                _write_varint(entries, len(value))
+                for key, digest in value.items():
+                    _write_varint(entries, string_id(key))
+                    entries += bytes.fromhex(digest)
+            elif isinstance(value, list):
+                entries.append(TAG_LIST)
+                _write_varint(entries, len(value))
+                entries += bytes.fromhex("".join(value))
+            else:
+                entries.append(TAG_STR)
+                entries += bytes.fromhex(value)
+
+    body = bytearray()
+    _write_varint(body, len(strings))
+    for text in strings:
+        encoded = text.encode()
+        _write_varint(body, len(encoded))
+        body += encoded
+    body += entries
+    return bytes(body)
+
+
+def decode_compact(data: bytes):
+    """Decode the compact binary format back into processed contributions with hex digests."""
+    if data[3] != FORMAT_VERSION:
+        raise ValueError(f"Unknown compact format version: {data[3]}")
+    compression, width = data[4], data[5]
+    body = memoryview(_decompress(data[6:], compression))
+
+    count, pos = _read_varint(body, 0)
+    strings = []
+    for _ in range(count):
+        length, pos = _read_varint(body, pos)
+        strings.append(bytes(body[pos:pos + length]).decode())
+        pos += length
+
+    processed = []
+    entry_count, pos = _read_varint(body, pos)
+    for _ in range(entry_count):
+        type_id, pos = _read_varint(body, pos)
+        field_count, pos = _read_varint(body, pos)
+        secured_data = {}
+        for _ in range(field_count):
+            name_id, pos = _read_varint(body, pos)
+            tag = body[pos]
+            pos += 1
+            if tag == TAG_DICT:
+                item_count, pos = _read_varint(body, pos)
+                value = {}
+                for _ in range(item_count):
+                    key_id, pos = _read_varint(body, pos)
+                    value[strings[key_id]] = body[pos:pos + width].hex()
+                    pos += width
+            elif tag == TAG_LIST:
+                item_count, pos = _read_varint(body, pos)
+                packed = body[pos:pos + item_count * width]
+                pos += item_count * width
+                # Let hex() put a separator after every digest and split on it, all in C
+                value = packed.hex(" ", width).split(" ") if item_count else []
+            elif tag == TAG_STR:
+                value = body[pos:pos + width].hex()
+                pos += width
+            else:
+                raise ValueError(f"Unknown field tag: {tag}")
+            secured_data[strings[name_id]] = value
+        processed.append({"type": strings[type_id - 1] if type_id else None, "securedSharedData": secured_data})
+    return processed
+
+
+def encode(processed, codec: str = CODEC_JSON, compression: str = "none"):
+    """Encode processed contributions for storage with the configured codec."""
+    if codec == CODEC_COMPACT:
+        return encode_compact(processed, compression)
+    return json.dumps(processed)
+
+def decode(value):
+    """Decode a stored value written in either the legacy JSON or the compact format."""
+    if isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:3]) == MAGIC:
+        return decode_compact(bytes(value))
+    return json.loads(value)
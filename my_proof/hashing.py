@@ -0,0 +1,122 @@
+import hashlib
+import json
+import math
+from functools import lru_cache
+from json import encoder as json_encoder
+
+# Version 1 is the original format: SHA-256 hex of the raw string, or of json.dumps(value) for
+# anything else. Every digest already stored in Redis uses it, so it stays the default.
+HASH_VERSION_LEGACY = 1
+# Version 2 hashes a canonical serialization with BLAKE2b, truncated to 16 bytes.
+HASH_VERSION_FAST = 2
+HASH_VERSIONS = (HASH_VERSION_LEGACY, HASH_VERSION_FAST)
+
+FAST_DIGEST_SIZE = 16
+MEMO_SIZE = 1 << 16
+
+
+def _make_encoder(ensure_ascii, item_separator, key_separator, sort_keys):
+    """
+    Build a reusable JSON encoder function.
+
+    json.dumps sets up a new encoder on every call, which costs about as much as encoding a small
+    order dict. Contribution data is parsed JSON and never circular, so the C encoder is built
+    once without a circular reference check. Falls back to json.JSONEncoder where the C
+    accelerator is unavailable.
+    """
+    string_encoder = json_encoder.encode_basestring_ascii if ensure_ascii else json_encoder.encode_basestring
+    if json_encoder.c_make_encoder is not None:
+        def default(value):
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+        encode = json_encoder.c_make_encoder(
+            None, default, string_encoder, None, key_separator, item_separator, sort_keys, False, True
+        )
+        return lambda value: "".join(encode(value, 0))
+    return json.JSONEncoder(
+        ensure_ascii=ensure_ascii, separators=(item_separator, key_separator), sort_keys=sort_keys
+    ).encode
+
+# Byte-for-byte the output of json.dumps(value)
+_legacy_json = _make_encoder(True, ', ', ': ', False)
+_canonical_json = _make_encoder(False, ',', ':', True)
+
+
+def canonical_json(value) -> str:
+    """Serialize value with sorted keys and no whitespace, so equal data always gives the same text."""
+    return _canonical_json(value)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _digest_legacy(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _digest_fast(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=FAST_DIGEST_SIZE).hexdigest()
+
+# Scalars are memoized on the value itself, which also skips their serialization. typed=True
+# keeps 1, 1.0 and True apart.
+@lru_cache(maxsize=MEMO_SIZE, typed=True)
+def _hash_scalar_legacy(value) -> str:
+    return _digest_legacy(value if isinstance(value, str) else _legacy_json(value))
+
+@lru_cache(maxsize=MEMO_SIZE, typed=True)
+def _hash_scalar_fast(value) -> str:
+    # Strings are hashed as JSON too, so "1" and 1 no longer collide
+    return _digest_fast(_canonical_json(value))
+
+# 0.0 and -0.0 are equal keys but serialize differently, so floats are memoized with their sign
+@lru_cache(maxsize=MEMO_SIZE)
+def _hash_float_legacy(value, sign) -> str:
+    return _digest_legacy(_legacy_json(value))
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _hash_float_fast(value, sign) -> str:
+    return _digest_fast(_canonical_json(value))
+
+
+def _hash_legacy(value) -> str:
+    if isinstance(value, (dict, list)):
+        return _digest_legacy(_legacy_json(value))
+    if isinstance(value, float):
+        return _hash_float_legacy(value, math.copysign(1, value))
+    return _hash_scalar_legacy(value)
+
+def _hash_fast(value) -> str:
+    if isinstance(value, (dict, list)):
+        return _digest_fast(_canonical_json(value))
+    if isinstance(value, float):
+        return _hash_float_fast(value, math.copysign(1, value))
+    return _hash_scalar_fast(value)
+
+_HASHERS = {
+    HASH_VERSION_LEGACY: _hash_legacy,
+    HASH_VERSION_FAST: _hash_fast,
+}
+
+
+def get_hasher(version: int = HASH_VERSION_LEGACY):
+    """Return the function that hashes one securedSharedData value in the given format version."""
+    try:
+        return _HASHERS[version]
+    except KeyError:
+        raise ValueError(f"Unknown hash version: {version}") from None
+
+def hash_value(value, version: int = HASH_VERSION_LEGACY) -> str:
+    """Hash one value of securedSharedData in the given hash format version."""
+    return get_hasher(version)(value)
+
+def versioned_key(key: str, version: int = HASH_VERSION_LEGACY) -> str:
+    """
+    Storage key for data hashed with the given version.
+
+    Legacy keys are left untouched; newer versions get a suffix so digests of different
+    formats are never compared with each other.
+    """
+    return key if version == HASH_VERSION_LEGACY else f"{key}:h{version}"
+
+def clear_memo() -> None:
+    """Forget memoized digests, e.g. between jobs of a long-running process."""
+    for memo in (_digest_legacy, _digest_fast, _hash_scalar_legacy, _hash_scalar_fast, _hash_float_legacy,
+                 _hash_float_fast):
+        memo.cache_clear()
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB
+CACHE_FOLDER = "history_cache"
+EVICT_TO = 0.9  # An eviction frees space down to this share of max_bytes, so it is not due on every write
+
+
+class HistoryCache:
+    """
+    On-disk LRU cache of processed history files, keyed by fileId.
+
+    Each entry is the output of process_secured_data for one earlier file, stored as its own
+    JSON file. Writes go to a temporary file first and are moved into place with os.replace,
+    so a proof that is killed mid-write never leaves a truncated entry behind. The modification
+    time of an entry is its last use; the oldest entries are evicted once the cache grows past
+    max_bytes, down to EVICT_TO of it. The total size is counted once by the first write and
+    then kept up to date in memory, so the directory is only scanned again when an eviction is due.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_size = None  # Bytes of all entries, None until the first write counts them
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, file_id) -> str:
+        # fileIds come from the validator API, so never use them as file names directly
+        digest = hashlib.sha256(str(file_id).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, file_id):
+        """Return the cached processed contributions for file_id, or None on a miss."""
+        if file_id is None:
+            return None
+        path = self._path(file_id)
+        try:
+            with open(path, 'r', encoding="utf-8") as cache_file:
+                processed = json.load(cache_file)
+            os.utime(path)  # Mark as recently used
+            return processed
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as error:
+            logging.warning(f"Dropping unreadable cache entry for fileId {file_id}: {error}")
+            self._remove(path)
+            return None
+
+    def put(self, file_id, processed) -> None:
+        """Atomically store processed contributions for file_id and evict old entries if needed."""
+        if file_id is None:
+            return
+        path = self._path(file_id)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding="utf-8") as tmp_file:
+                json.dump(processed, tmp_file)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                replaced_size = self._size(path)
+                os.replace(tmp_path, path)
+                if self._total_size is not None:
+                    self._total_size += size - replaced_size
+        except OSError as error:
+            logging.warning(f"Could not write cache entry for fileId {file_id}: {error}")
+            if tmp_path:
+                self._remove(tmp_path)
+            return
+        if self._total_size is None or self._total_size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """Scan the cache and, if it is over max_bytes, remove least recently used entries down to EVICT_TO of it."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            total_size = sum(size for _, size, _ in entries)
+            target_size = self.max_bytes * EVICT_TO if total_size > self.max_bytes else total_size
+            for _, size, name in sorted(entries):
+                if total_size <= target_size:
+                    break
+                self._remove(os.path.join(self.directory, name))
+                total_size -= size
+            self._total_size = total_size
+
+    @staticmethod
+    def _size(path) -> int:
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _remove(path) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_history_cache(config):
+    """Return the sealed history cache if sealing is available, otherwise None."""
+    if not config.get('use_sealing') or not config.get('sealed_dir'):
+        return None
+    try:
+        return HistoryCache(
+            os.path.join(config['sealed_dir'], CACHE_FOLDER),
+            int(config.get('history_cache_max_bytes', DEFAULT_MAX_BYTES))
+        )
+    except OSError as error:
+        logging.warning(f"History cache disabled: {error}")
+        return None
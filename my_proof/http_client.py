@@ -0,0 +1,144 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING
+
+from my_proof.metrics import metrics
+
+if TYPE_CHECKING:
+    import requests
+
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', 0.25))
+BACKOFF_MAX = 4.0
+# Send a second, hedged copy of an idempotent request if the first has not answered after this
+# many seconds. Disabled when unset.
+HEDGE_AFTER = float(os.environ['HTTP_HEDGE_AFTER']) if os.environ.get('HTTP_HEDGE_AFTER') else None
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 16))
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+class RequestCancelled(Exception):
+    """Raised instead of a new attempt once the caller's stop event is set."""
+
+
+_session = None
+_hedge_executor = None
+_lock = threading.Lock()
+
+
+def get_session() -> 'requests.Session':
+    """Return the process-wide session, so every call reuses pooled keep-alive connections."""
+    global _session
+    with _lock:
+        if _session is None:
+            # requests and urllib3 are imported with the first request, not at startup
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="http-hedge")
+        return _hedge_executor
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def _close_response(future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+def _send_hedged(method, url, hedge_after, **kwargs) -> 'requests.Response':
+    """Send a request and, if it has not answered after hedge_after seconds, race a second copy."""
+    session = get_session()
+    executor = _get_hedge_executor()
+    futures = [executor.submit(session.request, method, url, **kwargs)]
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        logging.info(f"Hedging {method} {url} after {hedge_after}s")
+        futures.append(executor.submit(session.request, method, url, **kwargs))
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # Close whichever copy loses the race once it finishes
+                for other in pending:
+                    other.add_done_callback(_close_response)
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+def request(method, url, idempotent=None, hedge_after=None, stop=None, **kwargs) -> 'requests.Response':
+    """
+    Send an HTTP request through the shared session with timeouts and retries.
+
+    Connect timeouts are always retried since the request never reached the server. Other
+    connection errors, read timeouts and 429/502/503/504 responses are only retried for idempotent
+    requests, which is the default for GET, HEAD, OPTIONS, PUT and DELETE. Idempotent requests
+    may also be hedged, see HEDGE_AFTER. When the threading.Event stop is set, no further attempt
+    is made and RequestCancelled is raised.
+    """
+    import requests
+
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    if hedge_after is None:
+        hedge_after = HEDGE_AFTER
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+
+    for attempt in range(MAX_RETRIES + 1):
+        if stop is not None and stop.is_set():
+            raise RequestCancelled(f"{method} {url} cancelled")
+        last_attempt = attempt == MAX_RETRIES
+        try:
+            if idempotent and hedge_after is not None:
+                response = _send_hedged(method, url, hedge_after, **kwargs)
+            else:
+                response = get_session().request(method, url, **kwargs)
+        except requests.exceptions.ConnectTimeout as error:
+            if last_attempt:
+                raise
+            logging.warning(f"Connect timeout for {method} {url}, retrying: {error}")
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+            if last_attempt or not idempotent:
+                raise
+            logging.warning(f"{method} {url} failed, retrying: {error}")
+        else:
+            if last_attempt or not idempotent or response.status_code not in RETRY_STATUSES:
+                metrics.incr('http_requests')
+                if not kwargs.get('stream'):
+                    # Streamed bodies are counted by whoever reads them
+                    metrics.incr('http_bytes_in', len(response.content))
+                return response
+            logging.warning(f"{method} {url} returned {response.status_code}, retrying")
+            response.close()
+        if stop is not None:
+            stop.wait(_backoff(attempt))
+        else:
+            time.sleep(_backoff(attempt))
+
+def get(url, **kwargs) -> 'requests.Response':
+    return request('GET', url, **kwargs)
+
+def post(url, **kwargs) -> 'requests.Response':
+    return request('POST', url, **kwargs)
@@ -0,0 +1,102 @@
+"""
+Logging helpers for the proof hot path.
+
+Log calls pass payloads through payload() or lazy() with %-style arguments, so nothing is
+formatted unless the record is actually emitted. payload() logs a short summary of a value
+(type, item counts, nested hash counts) unless full dumps are switched on with LOG_FULL_PAYLOADS,
+since full dumps of contribution data are large and leak hashed user data into logs. Emitted
+messages are cut to LOG_MAX_MESSAGE_CHARS either way.
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()  # 'text' or 'json'
+LOG_FULL_PAYLOADS = os.environ.get('LOG_FULL_PAYLOADS', 'false').lower() == 'true'
+LOG_MAX_MESSAGE_CHARS = int(os.environ.get('LOG_MAX_MESSAGE_CHARS', 2000))
+
+SECRET_CONFIG_KEYS = {'jwt_secret_key', 'signature', 'redis_pwd'}
+
+
+def truncate(text: str, limit: int = LOG_MAX_MESSAGE_CHARS) -> str:
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+def _count_leaves(value) -> int:
+    if isinstance(value, dict):
+        return sum(_count_leaves(item) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sum(_count_leaves(item) for item in value)
+    return 1
+
+def summarize(value) -> str:
+    """One-line description of value: its type, length and number of leaf values."""
+    if isinstance(value, dict):
+        return f"dict(keys={len(value)}, values={_count_leaves(value)})"
+    if isinstance(value, (list, tuple, set)):
+        return f"{type(value).__name__}(items={len(value)}, values={_count_leaves(value)})"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}(len={len(value)})"
+    return repr(value)
+
+
+class lazy:
+    """Defer a call until the log record that holds it is formatted."""
+
+    def __init__(self, fn, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.fn(*self.args, **self.kwargs))
+
+class payload(lazy):
+    """Log argument for a potentially large value: a summary, or the full value with LOG_FULL_PAYLOADS."""
+
+    def __init__(self, value):
+        super().__init__(lambda: value if LOG_FULL_PAYLOADS else summarize(value))
+
+
+def redact_config(config):
+    """Copy of config with secrets masked, safe to log."""
+    return {key: ('***' if key in SECRET_CONFIG_KEYS and value else value) for key, value in config.items()}
+
+
+class TruncateFilter(logging.Filter):
+    """Cap the length of every emitted message. Runs on the handler, so only for emitted records."""
+
+    def filter(self, record):
+        message = record.getMessage()
+        if LOG_MAX_MESSAGE_CHARS > 0 and len(message) > LOG_MAX_MESSAGE_CHARS:
+            record.msg = truncate(message)
+            record.args = ()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for the log pipeline."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging() -> None:
+    """Set up the root logger from LOG_LEVEL, LOG_FORMAT and LOG_MAX_MESSAGE_CHARS."""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.addFilter(TruncateFilter())
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter('%(message)s'))
+    logging.basicConfig(level=LOG_LEVEL, handlers=[handler], force=True)
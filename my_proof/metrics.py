@@ -0,0 +1,92 @@
+"""
+Per-proof timing and resource metrics.
+
+Stages are timed with span() and counters are bumped with incr() on the process-wide collector,
+from any thread. Spans with the same name add up, so a span entered by several worker threads
+(e.g. one download per history file) reports the summed time of all of them, not wall time.
+"""
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+METRICS_VERSION = 1
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where it cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Called with the stage name whenever a span ends, see profiling
+        self.stage_hooks = []
+        self.reset()
+
+    def reset(self):
+        """Start a new collection, e.g. for the next proof of a long-running process."""
+        with self._lock:
+            self.started = time.perf_counter()
+            self.stages = {}
+            self.counters = {}
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+            for hook in self.stage_hooks:
+                hook(name)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'count': 0})
+            stage['seconds'] += seconds
+            stage['count'] += 1
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """:return: Every stage and counter collected since the last reset, plus peak RSS"""
+        with self._lock:
+            return {
+                'version': METRICS_VERSION,
+                'wall_seconds': round(time.perf_counter() - self.started, 6),
+                'stages': {name: {'seconds': round(stage['seconds'], 6), 'count': stage['count']}
+                           for name, stage in self.stages.items()},
+                'counters': dict(self.counters),
+                'peak_rss_bytes': peak_rss_bytes(),
+            }
+
+    def summary(self):
+        """Compact form of snapshot() for the proof attributes: seconds per stage and the counters."""
+        snapshot = self.snapshot()
+        return {
+            'wall_s': round(snapshot['wall_seconds'], 3),
+            'stages_s': {name: round(stage['seconds'], 3) for name, stage in snapshot['stages'].items()},
+            **snapshot['counters'],
+            'peak_rss_mb': round(snapshot['peak_rss_bytes'] / 2 ** 20, 1) if snapshot['peak_rss_bytes'] else None,
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+metrics = Metrics()
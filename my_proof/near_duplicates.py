@@ -0,0 +1,291 @@
+"""
+Cross-wallet near-duplicate detection with MinHash and locality sensitive hashing.
+
+Exact uniqueness only compares a file with the same wallet's earlier files, so a lightly edited
+export uploaded from a second wallet scores as unique. Here every contribution gets a MinHash
+signature over the hashes of its securedSharedData. The signature is cut into LSH_BANDS bands
+of LSH_ROWS values, and each band is hashed into a bucket. Contributions that share a bucket
+become candidates, and their Jaccard similarity is estimated from the full signatures. A query
+only looks at the buckets of its own bands, so its cost depends on the number of candidates and
+not on the size of the index.
+
+With the defaults, pairs with a Jaccard similarity of 0.5 share at least one bucket with a
+probability of about 0.65, and pairs at 0.7 with about 0.99.
+
+Signatures are built from the versioned hashes, so each hash version gets its own index. A file
+is only added once its proof passed ownership and authenticity, see Proof.score_input: otherwise
+a wallet could plant someone else's export and have the owner's own upload capped later.
+"""
+import hashlib
+import logging
+
+import numpy as np
+
+from my_proof.hashing import HASH_VERSION_LEGACY, versioned_key
+from my_proof.uniqueness_index import INDEX_PREFIX, flatten_hashes
+from my_proof.vectorized_uniqueness import digest_prefixes
+
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+MAX_BUCKET_CANDIDATES = 200  # Per band and query, so a very common bucket cannot blow up a query
+FOLD_MIN_SIZE = 1 << 14  # Contributions added before their buckets are merged into the sorted arrays
+MINHASH_CHUNK = 4096  # Items hashed at once, so a signature needs NUM_PERM x MINHASH_CHUNK values at most
+NEAR_DUPLICATE_PREFIX = f"{INDEX_PREFIX}:nd"
+
+_SEEDS = np.random.default_rng(0x5EED).integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+# Odd multipliers that combine the rows of a band into one value (arithmetic wraps modulo 2**64)
+_ROW_MULTIPLIERS = np.random.default_rng(0xBA2D).integers(0, 2 ** 63, size=LSH_ROWS, dtype=np.uint64) | np.uint64(1)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, a cheap and well mixed 64-bit hash of every value."""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+def minhash(items: np.ndarray) -> np.ndarray:
+    """
+    MinHash signature of a set of 64-bit items.
+
+    :return: NUM_PERM uint32 values, the minimum of each of NUM_PERM hash functions over the items
+    """
+    items = np.unique(np.asarray(items, dtype=np.uint64))
+    minimum = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(items), MINHASH_CHUNK):
+        hashed = _mix(items[None, start:start + MINHASH_CHUNK] ^ _SEEDS[:, None])
+        np.minimum(minimum, hashed.min(axis=1), out=minimum)
+    return (minimum >> np.uint64(32)).astype(np.uint32)
+
+def contribution_signature(secured_data):
+    """:return: MinHash signature of a processed securedSharedData dict, or None if it holds no hashes"""
+    hashes = flatten_hashes(secured_data or {})
+    if not hashes:
+        return None
+    return minhash(digest_prefixes(sorted(hashes)))
+
+def band_hashes(signature: np.ndarray) -> np.ndarray:
+    """:return: One uint64 bucket per band of the signature"""
+    rows = signature.reshape(LSH_BANDS, LSH_ROWS).astype(np.uint64)
+    return _mix((rows * _ROW_MULTIPLIERS).sum(axis=1, dtype=np.uint64))
+
+def similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """:return: Estimated Jaccard similarity of signature with each row of others"""
+    return (others == signature).mean(axis=-1)
+
+
+class _BandTable:
+    """
+    Buckets of each band for one contribution type.
+
+    Buckets live in sorted (bucket, contribution) arrays, searched with searchsorted. New entries
+    go to a dict per band first and are merged into the arrays every FOLD_MIN_SIZE additions,
+    so adding and querying can be interleaved without re-sorting.
+    """
+
+    def __init__(self):
+        self._buckets = [np.empty(0, dtype=np.uint64) for _ in range(LSH_BANDS)]
+        self._members = [np.empty(0, dtype=np.uint32) for _ in range(LSH_BANDS)]
+        self._pending = [{} for _ in range(LSH_BANDS)]
+        self._pending_count = 0
+
+    def add(self, bands, member):
+        for band, bucket in enumerate(bands.tolist()):
+            self._pending[band].setdefault(bucket, []).append(member)
+        self._pending_count += 1
+        if self._pending_count >= FOLD_MIN_SIZE:
+            self._fold()
+
+    def _fold(self):
+        for band, pending in enumerate(self._pending):
+            buckets = np.fromiter((bucket for bucket, members in pending.items() for _ in members), dtype=np.uint64)
+            members = np.fromiter((member for members in pending.values() for member in members), dtype=np.uint32)
+            order = np.argsort(buckets, kind='stable')
+            positions = np.searchsorted(self._buckets[band], buckets[order], side='right')
+            self._buckets[band] = np.insert(self._buckets[band], positions, buckets[order])
+            self._members[band] = np.insert(self._members[band], positions, members[order])
+        self._pending = [{} for _ in range(LSH_BANDS)]
+        self._pending_count = 0
+
+    def candidates(self, bands):
+        found = []
+        for band, bucket in enumerate(bands):
+            start = np.searchsorted(self._buckets[band], bucket, side='left')
+            end = min(np.searchsorted(self._buckets[band], bucket, side='right'), start + MAX_BUCKET_CANDIDATES)
+            found.append(self._members[band][start:end])
+            pending = self._pending[band].get(int(bucket))
+            if pending:
+                found.append(np.array(pending[:MAX_BUCKET_CANDIDATES], dtype=np.uint32))
+        return np.unique(np.concatenate(found))
+
+
+class LocalNearDuplicateIndex:
+    """
+    In-memory index, for one process: a worker or batch run, or a benchmark.
+
+    Signatures are kept in one growing uint32 array, about 256 bytes per contribution.
+    """
+
+    def __init__(self, hash_version=HASH_VERSION_LEGACY):
+        self.hash_version = hash_version
+        self._tables = {}
+        self._signatures = np.empty((1024, NUM_PERM), dtype=np.uint32)
+        self._file_ids = []
+        self._wallets = []
+
+    def __len__(self):
+        return len(self._file_ids)
+
+    def add(self, task_type, file_id, wallet_address, signature):
+        member = len(self._file_ids)
+        if member == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[member] = signature
+        self._file_ids.append(file_id)
+        self._wallets.append(str(wallet_address).lower())
+        self._tables.setdefault(task_type, _BandTable()).add(band_hashes(signature), member)
+
+    def query(self, task_type, signature, exclude_wallet=None, exclude_file_id=None, top_k=5, min_similarity=0.0):
+        """
+        Most similar contributions of task_type already in the index.
+
+        Contributions of exclude_wallet and exclude_file_id are left out.
+        :return: [(fileId, estimated similarity)], most similar first, at most top_k
+        """
+        table = self._tables.get(task_type)
+        if table is None:
+            return []
+        members = table.candidates(band_hashes(signature))
+        exclude_wallet = str(exclude_wallet).lower() if exclude_wallet else None
+        members = [
+            member for member in members.tolist()
+            if self._wallets[member] != exclude_wallet and self._file_ids[member] != exclude_file_id
+        ]
+        if not members:
+            return []
+        scores = similarity(signature, self._signatures[members])
+        ranked = np.argsort(-scores, kind='stable')[:top_k]
+        return [(self._file_ids[members[idx]], float(scores[idx])) for idx in ranked if scores[idx] >= min_similarity]
+
+
+WALLET_DIGEST_SIZE = 16
+
+def _wallet_digest(wallet_address):
+    return hashlib.blake2b(str(wallet_address).lower().encode(), digest_size=WALLET_DIGEST_SIZE).digest()
+
+class RedisNearDuplicateIndex:
+    """
+    Index shared by every proof through Redis.
+
+    Each band bucket is a set of fileIds. Signatures and wallets are kept in one hash per
+    contribution type, so candidates are scored after a single pipelined round trip. Like the
+    other index sets, keys of newer hash versions get a suffix, see hashing.versioned_key.
+    """
+
+    def __init__(self, redis_client, hash_version=HASH_VERSION_LEGACY):
+        self.redis = redis_client
+        self.hash_version = hash_version
+
+    def _bucket_key(self, task_type, band, bucket):
+        return versioned_key(f"{NEAR_DUPLICATE_PREFIX}:{task_type}:{band}:{int(bucket):016x}", self.hash_version)
+
+    def _signatures_key(self, task_type):
+        return versioned_key(f"{NEAR_DUPLICATE_PREFIX}:{task_type}:signatures", self.hash_version)
+
+    def add(self, task_type, file_id, wallet_address, signature):
+        pipeline = self.redis.pipeline(transaction=False)
+        self.queue_add(pipeline, task_type, file_id, wallet_address, signature)
+        pipeline.execute()
+
+    def queue_add(self, pipeline, task_type, file_id, wallet_address, signature):
+        for band, bucket in enumerate(band_hashes(signature)):
+            pipeline.sadd(self._bucket_key(task_type, band, bucket), file_id)
+        # The wallet is stored next to the signature, as a fixed size digest
+        pipeline.hset(self._signatures_key(task_type), file_id, _wallet_digest(wallet_address) + signature.astype("<u4").tobytes())
+
+    def query(self, task_type, signature, exclude_wallet=None, exclude_file_id=None, top_k=5, min_similarity=0.0):
+        """Same as LocalNearDuplicateIndex.query."""
+        pipeline = self.redis.pipeline(transaction=False)
+        for band, bucket in enumerate(band_hashes(signature)):
+            pipeline.srandmember(self._bucket_key(task_type, band, bucket), MAX_BUCKET_CANDIDATES)
+        members = set()
+        for found in pipeline.execute():
+            members.update(member.decode() if isinstance(member, bytes) else member for member in found or [])
+        members.discard(exclude_file_id)
+        if not members:
+            return []
+
+        members = sorted(members)
+        stored = self.redis.hmget(self._signatures_key(task_type), members)
+        exclude_wallet = _wallet_digest(exclude_wallet) if exclude_wallet else None
+        kept, signatures = [], []
+        for file_id, value in zip(members, stored):
+            if not value or len(value) != WALLET_DIGEST_SIZE + 4 * NUM_PERM or value[:WALLET_DIGEST_SIZE] == exclude_wallet:
+                continue
+            kept.append(file_id)
+            signatures.append(np.frombuffer(value[WALLET_DIGEST_SIZE:], dtype="<u4"))
+        if not kept:
+            return []
+        scores = similarity(signature, np.stack(signatures))
+        ranked = np.argsort(-scores, kind='stable')[:top_k]
+        return [(kept[idx], float(scores[idx])) for idx in ranked if scores[idx] >= min_similarity]
+
+
+_local_indexes = {}
+
+def get_near_duplicate_index(config, redis_client=None):
+    """:return: The index configured by near_duplicate_index, or None if it is off or Redis is unreachable"""
+    backend = config.get('near_duplicate_index', 'none')
+    hash_version = int(config.get('hash_version', HASH_VERSION_LEGACY))
+    if backend == 'redis':
+        return RedisNearDuplicateIndex(redis_client, hash_version) if redis_client else None
+    if backend == 'local':
+        if hash_version not in _local_indexes:
+            _local_indexes[hash_version] = LocalNearDuplicateIndex(hash_version)
+        return _local_indexes[hash_version]
+    return None
+
+def contribution_signatures(processed_curr_data):
+    """:return: {contribution type: MinHash signature} of a processed file, for types holding any hashes"""
+    signatures = {}
+    for entry in processed_curr_data:
+        signature = contribution_signature(entry.get("securedSharedData"))
+        if signature is not None:
+            signatures[entry.get("type")] = signature
+    return signatures
+
+def apply_near_duplicates(index, response, signatures, file_id, wallet_address, threshold=0.5, top_k=5):
+    """
+    Lower uniqueness for contribution types that nearly duplicate another wallet's.
+
+    A contribution with estimated Jaccard similarity s to another wallet's contribution of its
+    type shares at least that fraction of its hashes with it, so its unique hash count is capped
+    at (1 - s) of its total. Matches are listed under "near_duplicates" of the type's result.
+    The file itself is not added here, see add_to_near_duplicate_index.
+    :param signatures: contribution_signatures of the file
+    :return: response, with the scores updated
+    """
+    for result in response["comparison_results"]:
+        signature = signatures.get(result["type"])
+        if signature is None:
+            continue
+        matches = index.query(result["type"], signature, wallet_address, file_id, top_k, threshold)
+        if not matches:
+            continue
+        best = matches[0][1]
+        total = result["total_hashes_in_curr"]
+        result["unique_hashes_in_curr"] = min(result["unique_hashes_in_curr"], int(total * (1 - best)))
+        result["type_unique_score"] = result["unique_hashes_in_curr"] / total if total else 0
+        result["near_duplicates"] = [{"file_id": match, "similarity": round(score, 3)} for match, score in matches]
+        logging.info(f"{result['type']} is {best:.0%} similar to {len(matches)} contributions of other wallets")
+
+    results = response["comparison_results"]
+    response["total_normalized_score"] = sum(entry["type_unique_score"] for entry in results) / len(results) if results else 0
+    return response
+
+def add_to_near_duplicate_index(index, signatures, file_id, wallet_address):
+    """Index a file's signatures, so later files of other wallets are compared with it."""
+    if not file_id:
+        return
+    for task_type, signature in signatures.items():
+        index.add(task_type, file_id, wallet_address, signature)
@@ -0,0 +1,156 @@
+"""
+Opt-in profiling of a proof run, enabled with PROFILE=cpu, PROFILE=memory or PROFILE=cpu,memory.
+
+cpu writes profile.pstats (load it with pstats or snakeviz) and profile.txt, the top
+PROFILE_TOP_N functions by cumulative time. Every thread started during the run is profiled,
+not only the main one: before Python 3.12 each thread gets its own profiler, from 3.12 on the
+one sys.monitoring based profiler sees all threads. memory traces allocations with tracemalloc, records traced memory at the
+end of every metrics span and writes memory_profile.json with the top PROFILE_TOP_N allocation
+sites of the run.
+
+Reports only hold code locations, call counts, timings and sizes, never contribution data.
+When PROFILE is unset run() is called directly and nothing is hooked.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+
+from my_proof.metrics import metrics
+
+PROFILE_MODES = {mode.strip() for mode in os.environ.get('PROFILE', '').lower().split(',') if mode.strip()}
+PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', 25))
+TRACEMALLOC_FRAMES = 1
+# From 3.12 cProfile uses sys.monitoring, which allows one active profiler for all threads
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+class ThreadedProfile:
+    """cProfile only sees the thread it was enabled in, so give every new thread its own profiler."""
+
+    def __init__(self):
+        self.main = cProfile.Profile()
+        self.thread_profiles = []
+        self._lock = threading.Lock()
+
+    def _start_thread(self, frame, event, arg):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as error:
+            # Never let the profiler take a worker thread down; this thread just goes unprofiled
+            sys.setprofile(None)
+            logging.debug(f"Thread not profiled: {error}")
+            return
+        with self._lock:
+            self.thread_profiles.append(profile)
+
+    def enable(self):
+        if PER_THREAD_PROFILES:
+            threading.setprofile(self._start_thread)
+        self.main.enable()
+
+    def disable(self):
+        self.main.disable()
+        if PER_THREAD_PROFILES:
+            threading.setprofile(None)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.main)
+        with self._lock:
+            for profile in self.thread_profiles:
+                stats.add(profile)
+        return stats
+
+
+class MemoryProfile:
+    """Traced memory at each stage boundary and the allocation sites that grew most over the run."""
+
+    def __init__(self):
+        self.stages = []
+        self._lock = threading.Lock()
+        self._start = None
+
+    def _on_stage_end(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            self.stages.append({'stage': name, 'current_bytes': current, 'peak_bytes': peak})
+
+    def enable(self):
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._start = tracemalloc.take_snapshot()
+        metrics.stage_hooks.append(self._on_stage_end)
+
+    def disable(self):
+        metrics.stage_hooks.remove(self._on_stage_end)
+        end = self._filter(tracemalloc.take_snapshot())
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        top = end.compare_to(self._filter(self._start), 'lineno')[:PROFILE_TOP_N]
+        return {
+            'traced_current_bytes': current,
+            'traced_peak_bytes': peak,
+            'stages': self.stages,
+            'top_allocations': [
+                {
+                    'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    'size_bytes': stat.size,
+                    'size_diff_bytes': stat.size_diff,
+                    'count': stat.count,
+                }
+                for stat in top
+            ],
+        }
+
+    @staticmethod
+    def _filter(snapshot):
+        return snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+
+
+def write_cpu_report(profile: ThreadedProfile, output_dir) -> None:
+    stats = profile.stats()
+    stats.dump_stats(os.path.join(output_dir, "profile.pstats"))
+    report = io.StringIO()
+    stats.stream = report
+    stats.sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+    with open(os.path.join(output_dir, "profile.txt"), 'w', encoding='utf-8') as f:
+        f.write(report.getvalue())
+
+
+def run_profiled(run, output_dir, modes=None):
+    """
+    Call run() under the profilers selected by PROFILE and write their reports to output_dir.
+
+    Reports are written even if run() fails, since failing runs are often the ones to look at.
+    """
+    modes = PROFILE_MODES if modes is None else modes
+    if not modes:
+        return run()
+    unknown = modes - {'cpu', 'memory'}
+    if unknown:
+        raise ValueError(f"Unknown PROFILE mode(s): {', '.join(sorted(unknown))}")
+
+    cpu = ThreadedProfile() if 'cpu' in modes else None
+    memory = MemoryProfile() if 'memory' in modes else None
+    if memory:
+        memory.enable()
+    if cpu:
+        cpu.enable()
+    try:
+        return run()
+    finally:
+        if cpu:
+            cpu.disable()
+            write_cpu_report(cpu, output_dir)
+        if memory:
+            with open(os.path.join(output_dir, "memory_profile.json"), 'w', encoding='utf-8') as f:
+                json.dump(memory.disable(), f, indent=2)
+        logging.info(f"Profiling reports ({', '.join(sorted(modes))}) written to {output_dir}")
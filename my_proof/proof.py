@@ -1,78 +1,233 @@
-import json
 import logging
 import os
-from typing import Dict, Any
-import requests
-from jwt import encode as jwt_encode
-import pandas as pd
-import numpy as np
-from typing import Any, List, Dict
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, List, Dict, Optional
 from datetime import datetime, timedelta, timezone
 
+from my_proof.archive import iter_input_documents
+from my_proof.metrics import metrics
 from my_proof.proof_of_authenticity import calculate_authenticity_score
 from my_proof.proof_of_ownership import calculate_ownership_score, generate_jwt_token
 from my_proof.proof_of_quality import calculate_quality_n_type_score, points, calculate_max_points
-from my_proof.proof_of_uniqueness import uniqueness_helper
-from my_proof.models.proof_response import ProofResponse
+from my_proof.proof_of_uniqueness import fetch_file_details, get_redis_client, index_near_duplicates, store_current_file, uniqueness_helper
+from my_proof.result_cache import get_result_cache, is_cacheable, result_cache_key
 
-# Ensure logging is configured
-logging.basicConfig(level=logging.INFO)
+if TYPE_CHECKING:
+    from my_proof.models.proof_response import ProofResponse
 
 
 CONTRIBUTION_THRESHOLD = 4
 EXTRA_POINTS = 5
+STAGE_GRAPH = ["ownership", "uniqueness (userinfo -> history -> compare)"]
+VALID_DOMAINS = ["reclaimprotocol.org"]
+
+
+def run_stage(name, fn, *args):
+    """Run one stage of the proof, logging when it starts and how long it took."""
+    logging.info(f"Stage {name} started")
+    start = time.perf_counter()
+    try:
+        with metrics.span(name):
+            return fn(*args)
+    finally:
+        logging.info(f"Stage {name} finished in {time.perf_counter() - start:.3f}s")
 
 class Proof:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
-        self.proof_response = ProofResponse(dlp_id=config['dlp_id'])
         self.proof_response_object = {
             'dlp_id': self.config.get('dlp_id', '24'),
             'valid': True,
         }
+        self.last_scoring_record = None
 
-    def generate(self) -> ProofResponse:
+    @cached_property
+    def proof_response(self) -> 'ProofResponse':
+        # Built on first use: importing pydantic costs more than the rest of the startup together
+        from my_proof.models.proof_response import ProofResponse
+        return ProofResponse(dlp_id=self.config['dlp_id'])
+
+    def generate(self) -> 'ProofResponse':
         """Generate proofs for all input files."""
         logging.info("Starting proof generation")
 
-        for input_filename in os.listdir(self.config['input_dir']):
-            input_file = os.path.join(self.config['input_dir'], input_filename)
-            if os.path.splitext(input_file)[1].lower() == '.json':
-                with open(input_file, 'r', encoding='utf-8') as f:
-                    input_data = json.load(f)
-
-                logging.info(f"Processing file: {input_filename}")
-               
-                # self.proof_response_object['ownership'] = 1.0
-                wallet_w_types = self.extract_wallet_address_and_types(input_data) 
-                self.proof_response_object['ownership'] = self.calculate_ownership_score(wallet_w_types)
-                input_hash_details = uniqueness_helper(input_data)
-                unique_entry_details = input_hash_details.get("unique_entries")
-
-                final_scores =  self.calculate_individual_scores(input_data, self.config, unique_entry_details, valid_domains=["reclaimprotocol.org"])
-                self.proof_response_object['uniqueness'] = final_scores['uniqueness_score']
-                self.proof_response_object['quality'] = final_scores['quality_score']
-                self.proof_response_object['authenticity'] = final_scores['authenticity_score']
-                self.proof_response_object['score'] = final_scores['score']
-
-                # self.proof_response_object['uniqueness'] = input_hash_details.get("uniqueness_score")
-                # self.proof_response_object['quality'] = self.calculate_quality_score(input_data, unique_entry_details)
-                # self.proof_response_object['authenticity'] = self.calculate_authenticity_score(input_data)
-
-                if self.proof_response_object['authenticity'] < 1.0:
-                    self.proof_response_object['valid'] = False
-
-                # Calculate the final score
-                # self.proof_response_object['score'] = self.calculate_final_score(self.proof_response_object)
-
-                # self.proof_response_object['attributes'] = {
-                #     # 'normalizedContributionScore': contribution_score_result['normalized_dynamic_score'],
-                #     # 'totalContributionScore': contribution_score_result['total_dynamic_score'],
-                # }
-
-        logging.info(f"Proof response: {self.proof_response_object}")
+        # .json files and the JSON members of ZIP inputs, read in place without extracting
+        for input_name, input_data in iter_input_documents(self.config['input_dir']):
+            logging.info(f"Processing file: {input_name}")
+            self.score_input(input_data)
+
+        if self.config.get('metrics_in_attributes'):
+            self.proof_response_object.setdefault('attributes', {})['metrics'] = metrics.summary()
+
+        logging.info("Proof response: %s", self.proof_response_object)
+        return self.proof_response_object
+
+    def score_input(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Score one input document into proof_response_object."""
+        if self.config.get('lazy_scoring'):
+            with metrics.span("local_checks"):
+                skip_reason = self.check_short_circuit(input_data)
+            if skip_reason:
+                self.apply_short_circuit(input_data, skip_reason)
+                return self.proof_response_object
+
+        # self.proof_response_object['ownership'] = 1.0
+        wallet_w_types = self.extract_wallet_address_and_types(input_data) 
+
+        # Ownership does not depend on the uniqueness chain (userinfo -> history -> compare),
+        # so both network-bound stages run side by side and scoring waits for the slower one.
+        # Ownership starts first, so it also overlaps the result cache lookup.
+        logging.info(f"Stage graph: {' || '.join(STAGE_GRAPH)} -> scoring")
+        executor = ThreadPoolExecutor(max_workers=len(STAGE_GRAPH), thread_name_prefix="proof-stage")
+        try:
+            ownership_future = executor.submit(run_stage, "ownership", self.calculate_ownership_score, wallet_w_types)
+
+            # A retried job with the same input, settings and history returns the stored result
+            # without waiting for ownership
+            file_list = cache_key = None
+            result_cache = get_result_cache(self.config, get_redis_client() if self.config.get('result_cache') == 'redis' else None)
+            if result_cache:
+                with metrics.span("userinfo"):
+                    file_list = fetch_file_details(input_data.get('walletAddress'))
+                if file_list is not None:
+                    file_id = self.config.get('file_id') or os.environ.get('FILE_ID')
+                    cache_key = result_cache_key(input_data, self.config, file_list, self.scoring_tables(), file_id)
+                    with metrics.span("result_cache"):
+                        cached = result_cache.get(cache_key)
+                    if cached is not None:
+                        metrics.incr('result_cache_hits')
+                        logging.info(f"Reusing the stored result for fileId {file_id}")
+                        self.proof_response_object.update(cached['result'])
+                        self.last_scoring_record = cached.get('scoring_record')
+                        return self.proof_response_object
+                    metrics.incr('result_cache_misses')
+
+            uniqueness_future = executor.submit(run_stage, "uniqueness", uniqueness_helper, input_data, self.config, file_list)
+            self.proof_response_object['ownership'] = ownership_future.result()
+            input_hash_details = uniqueness_future.result()
+        finally:
+            # On a cache hit the ownership call is left to finish in the background
+            executor.shutdown(wait=False)
+
+        unique_entry_details = input_hash_details.get("unique_entries")
+        self.last_scoring_record = self.scoring_record(input_data, unique_entry_details)
+        if input_hash_details.get("coverage"):
+            # How much of the wallet's history the uniqueness score is based on
+            self.proof_response_object.setdefault('attributes', {})['history_coverage'] = input_hash_details["coverage"]
+        if input_hash_details.get("near_duplicates"):
+            # Contributions of other wallets this file nearly duplicates, per type
+            self.proof_response_object.setdefault('attributes', {})['near_duplicates'] = input_hash_details["near_duplicates"]
+
+        with metrics.span("scoring"):
+            final_scores =  self.calculate_individual_scores(input_data, self.config, unique_entry_details, valid_domains=VALID_DOMAINS)
+        self.proof_response_object['uniqueness'] = final_scores['uniqueness_score']
+        self.proof_response_object['quality'] = final_scores['quality_score']
+        self.proof_response_object['authenticity'] = final_scores['authenticity_score']
+        self.proof_response_object['score'] = final_scores['score']
+
+        # self.proof_response_object['uniqueness'] = input_hash_details.get("uniqueness_score")
+        # self.proof_response_object['quality'] = self.calculate_quality_score(input_data, unique_entry_details)
+        # self.proof_response_object['authenticity'] = self.calculate_authenticity_score(input_data)
+
+        if self.proof_response_object['authenticity'] < 1.0:
+            self.proof_response_object['valid'] = False
+
+        # Only proofs that passed ownership and authenticity become references for other wallets
+        if self.proof_response_object['ownership'] == 1.0 and self.proof_response_object['valid']:
+            index_near_duplicates(
+                self.config, input_hash_details.get("near_duplicate_signatures"),
+                self.config.get('file_id') or os.environ.get('FILE_ID'), input_data.get('walletAddress')
+            )
+
+        # Calculate the final score
+        # self.proof_response_object['score'] = self.calculate_final_score(self.proof_response_object)
+
+        # self.proof_response_object['attributes'] = {
+        #     # 'normalizedContributionScore': contribution_score_result['normalized_dynamic_score'],
+        #     # 'totalContributionScore': contribution_score_result['total_dynamic_score'],
+        # }
+        if cache_key and is_cacheable(self.proof_response_object):
+            result_cache.put(cache_key, {'result': self.proof_response_object, 'scoring_record': self.last_scoring_record})
         return self.proof_response_object
 
+    def scoring_record(self, input_data: Dict[str, Any], unique_entry_details: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        :return: What calculate_individual_scores reads, so the file can be re-scored offline by my_proof.rescore
+        """
+        return {
+            'ownership': self.proof_response_object.get('ownership'),
+            'contributions': [
+                {'type': contribution.get('type'), 'witnesses': contribution.get('witnesses', '')}
+                for contribution in input_data.get('contributions', [])
+            ],
+            'unique_entries': unique_entry_details,
+        }
+
+    @staticmethod
+    def scoring_tables() -> Dict[str, Any]:
+        """Constants the scores are computed from; a change to any of them invalidates stored results."""
+        return {
+            'points': points,
+            'valid_domains': VALID_DOMAINS,
+            'contribution_threshold': CONTRIBUTION_THRESHOLD,
+            'extra_points': EXTRA_POINTS,
+        }
+
+    def check_short_circuit(self, input_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Run the cheap local checks and decide whether the network-bound stages can be skipped.
+
+        They are skipped when the file is already invalid (bad schema or failed authenticity),
+        or when even fully unique data could not lift the score above score_tolerance.
+        :return: The reason for skipping, or None if ownership and uniqueness must be computed
+        """
+        contributions = input_data.get('contributions')
+        if not contributions or not all(
+            isinstance(contribution, dict) and contribution.get('type')
+            and isinstance(contribution.get('securedSharedData'), dict)
+            for contribution in contributions
+        ):
+            return "invalid contribution schema"
+
+        authenticity_scores = self.calculate_type_authenticity_scores(contributions, VALID_DOMAINS)
+        if min(authenticity_scores.values()) < 1:
+            return "authenticity check failed"
+
+        known_types = {contribution['type'] for contribution in contributions if contribution['type'] in points}
+        max_score = sum(points[task_type] for task_type in known_types) / calculate_max_points(points)
+        if max_score <= self.config.get('score_tolerance', 0.0):
+            return f"score cannot exceed {max_score:.4f}"
+
+        return None
+
+    def apply_short_circuit(self, input_data: Dict[str, Any], reason: str) -> None:
+        """
+        Fill the response for a file whose outcome was decided by the local checks.
+
+        Ownership, uniqueness and quality were not computed, so they are listed under
+        attributes.skipped instead of being reported as scores of 0.
+        """
+        logging.info(f"Skipping ownership and uniqueness: {reason}")
+        contributions = input_data.get('contributions') or []
+        authenticity_scores = {}
+        if reason != "invalid contribution schema":
+            authenticity_scores = self.calculate_type_authenticity_scores(contributions, VALID_DOMAINS)
+            # Later proofs of the wallet compare against this file too, so its hashes are stored
+            # as a scored file's would be, instead of being downloaded again by each of them
+            store_current_file(self.config.get('file_id') or os.environ.get('FILE_ID'), input_data, self.config)
+
+        self.proof_response_object['authenticity'] = (
+            sum(authenticity_scores.values()) / len(authenticity_scores) if authenticity_scores else 0
+        )
+        self.proof_response_object['score'] = 0.0
+        if self.proof_response_object['authenticity'] < 1.0:
+            self.proof_response_object['valid'] = False
+
+        attributes = self.proof_response_object.setdefault('attributes', {})
+        attributes['skipped'] = {'components': ['ownership', 'uniqueness', 'quality'], 'reason': reason}
+
     def generate_jwt_token(self, wallet_address):
         secret_key = self.config.get('jwt_secret_key', 'default_secret')
         expiration_time = self.config.get('jwt_expiration_time', 16000)  # Set to 10 minutes (600 seconds)
@@ -86,6 +241,7 @@ class Proof:
         }
         
         # Encode the JWT
+        from jwt import encode as jwt_encode
         token = jwt_encode(payload, secret_key, algorithm='HS256')
         return token
 
@@ -115,6 +271,20 @@ class Proof:
     def calculate_quality_score(self, input_data, unique_entries):
         return calculate_quality_n_type_score(input_data, self.config, unique_entries).get('quality_score', 0)
     
+    def calculate_type_authenticity_scores(self, contributions: List[Dict[str, Any]], valid_domains: List[str]) -> Dict[str, int]:
+        """Score each contribution type 1 if its witnesses contain a valid domain, otherwise 0."""
+        authenticity_scores = {}
+        for contribution in contributions:
+            task_type = contribution['type']
+            witness_urls = contribution.get('witnesses', [])
+            
+            # Determine if any valid domain is present
+            auth_score =  1 if any(domain in contribution.get('witnesses', '') for domain in valid_domains) else 0
+            logging.info(f"Authenticity score for {task_type}: {auth_score}, with witness URLs: {witness_urls}")
+            
+            authenticity_scores[task_type] = auth_score
+        return authenticity_scores
+
     def calculate_individual_scores(
         self,
         input_data: Dict[str, Any], 
@@ -130,16 +300,7 @@ class Proof:
         type_scores = quality_results["type_scores"]
         
         # Calculate authenticity scores
-        authenticity_scores = {}
-        for contribution in input_data['contributions']:
-            task_type = contribution['type']
-            witness_urls = contribution.get('witnesses', [])
-            
-            # Determine if any valid domain is present
-            auth_score =  1 if any(domain in contribution.get('witnesses', '') for domain in valid_domains) else 0
-            logging.info(f"Authenticity score for {task_type}: {auth_score}, with witness URLs: {witness_urls}")
-            
-            authenticity_scores[task_type] = auth_score
+        authenticity_scores = self.calculate_type_authenticity_scores(input_data['contributions'], valid_domains)
         
         # Combine scores
         final_scores = {}
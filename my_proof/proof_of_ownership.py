@@ -1,6 +1,7 @@
-import requests
 import logging
 
+from my_proof import http_client
+
 def generate_jwt_token(wallet_address: str, secret_key: str, expiration_time: int) -> str:
     """Generate a JWT token for a given wallet address."""
     from jwt import encode as jwt_encode
@@ -20,6 +21,8 @@ def generate_jwt_token(wallet_address: str, secret_key: str, expiration_time: in
 
 def calculate_ownership_score(jwt_token: str, data: dict, validator_url: str) -> float:
     """Calculate ownership score by verifying data against an external API."""
+    import requests
+
     if not jwt_token or not isinstance(jwt_token, str):
         raise ValueError('JWT token is required and must be a string')
     if not data.get('walletAddress') or len(data.get('types', [])) == 0:
@@ -33,7 +36,7 @@ def calculate_ownership_score(jwt_token: str, data: dict, validator_url: str) ->
         endpoint = "/api/datavalidation"
         url = f"{validator_url.rstrip('/')}{endpoint}"
 
-        response = requests.post(url, json=data, headers=headers)
+        response = http_client.post(url, json=data, headers=headers)
 
         response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
 
@@ -1,5 +1,7 @@
 import logging
 
+from my_proof.log_utils import payload
+
 points = {
     "REDDIT":15,
     "STEAM":10,
@@ -14,20 +16,23 @@ points = {
     "TWITTER":10,
 }
 
+# Types scored by their number of unique entries, and types scored by their uniqueness score
+COUNT_SCORED_TYPES = ['UBER', 'AMAZON_PRIME', 'ZOMATO', 'SPOTIFY', 'NETFLIX']
+SHARE_SCORED_TYPES = ['REDDIT', 'STEAM', 'TWITCH', 'TWITTER', 'LINKEDIN', 'GITHUB']
+
+# (minimum unique entries, share of the type's points), highest tier first
+DYNAMIC_SCORE_TIERS = [(10, 1.0), (5, 0.5), (1, 0.1)]
+
 def calculate_max_points(points_dict):
     return sum(points_dict.values())
 
 def get_dynamic_task_score(uniqueness_count, task_type):
     max_point = points[task_type]
 
-    if uniqueness_count >= 10:
-        return max_point
-    elif 5 <= uniqueness_count <= 9:
-        return max_point * 0.5
-    elif 1 <= uniqueness_count <= 4:
-        return max_point * 0.1
-    else:
-        return 0
+    for min_count, share in DYNAMIC_SCORE_TIERS:
+        if uniqueness_count >= min_count:
+            return max_point * share
+    return 0
 
 def calculate_quality_n_type_score(input_data, config, unique_entry_details):
     """Calculate quality score based on contribution data and input files."""
@@ -36,7 +41,7 @@ def calculate_quality_n_type_score(input_data, config, unique_entry_details):
     total_max_score = 0
 
     # Convert unique_entry_details into a dictionary for quick lookup
-    logging.info(f"unique_entry_details is {unique_entry_details}")
+    logging.info("unique_entry_details is %s", payload(unique_entry_details))
     unique_entries_dict = {
     entry["type"]: {
         "unique_entry_count": entry["unique_entry_count"], 
@@ -54,10 +59,10 @@ def calculate_quality_n_type_score(input_data, config, unique_entry_details):
         if task_type in points:
             total_max_score += points[task_type] # Only sum max scores for submitted types
         
-        if task_type in ['UBER', 'AMAZON_PRIME', 'ZOMATO', 'SPOTIFY', 'NETFLIX']:
+        if task_type in COUNT_SCORED_TYPES:
             type_points = get_dynamic_task_score(type_unique_count, task_type)  # Use unique_entries instead of order_count
             type_quality_score = type_points / points[task_type] if points[task_type] > 0 else 0
-        elif task_type in ['REDDIT', 'STEAM', 'TWITCH', 'TWITTER', 'LINKEDIN', 'GITHUB']:
+        elif task_type in SHARE_SCORED_TYPES:
             type_points = points[task_type] * type_uniqueness_score
             type_quality_score = type_points / points[task_type] if points[task_type] > 0 else 0
         else:
@@ -75,7 +80,7 @@ def calculate_quality_n_type_score(input_data, config, unique_entry_details):
     normalized_total_score = total_secured_points / total_max_score if total_max_score > 0 else 0
 
     # Log the results
-    logging.info(f"Final Scores: {type_scores}")
+    logging.info("Final Scores: %s", payload(type_scores))
     logging.info(f"Total Secured Score: {total_secured_points}")
     logging.info(f"Total Max Score: {total_max_score}")
     logging.info(f"Normalized Total Score: {normalized_total_score}")
@@ -1,50 +1,83 @@
-import hashlib
-import zipfile
-import redis
-import hashlib
-import json
+import tempfile
 import logging
 import os
-from urllib.parse import urlparse
-import requests
-import gnupg
-from jwt import encode as jwt_encode
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 from datetime import datetime, timedelta, timezone
+from my_proof import codec, http_client
+from my_proof.archive import JsonStream, open_json_document
+from my_proof.hashing import HASH_VERSION_LEGACY, get_hasher, versioned_key
+from my_proof.history_cache import get_history_cache
+from my_proof.log_utils import lazy, payload
+from my_proof.metrics import metrics
+from my_proof.uniqueness_index import backfill_wallet_index, flatten_hashes, history_key, index_uniqueness
+
+DEFAULT_HISTORY_WORKERS = 4
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MIN_DOWNLOAD_TIMEOUT = 0.1  # Seconds; downloads started right at the deadline still get one short try
+REDIS_BATCH_SIZE = 50  # History keys fetched or written per pipeline round trip
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 16))
+
+_redis_pool = None
+_redis_client = None
 
 # Connect to Redis
 def get_redis_client():
-    try:
-        redis_client = redis.StrictRedis(
+    """
+    Return a connected client, reused for the life of the process once a connection succeeds.
+
+    Batch and worker processes score many files; reusing the client keeps its connection pool
+    instead of connecting and pinging again per file. The pool is shared by every thread of the
+    process and holds at most REDIS_MAX_CONNECTIONS connections; a thread that finds them all in
+    use waits for one. Failed connections are retried on the next call, and so is a client whose
+    commands failed since, see reset_redis_client.
+    """
+    global _redis_client, _redis_pool
+    if _redis_client is not None:
+        return _redis_client
+    import redis
+    if _redis_pool is None:
+        _redis_pool = redis.BlockingConnectionPool(
             host= os.environ.get('REDIS_HOST', None),
             port= os.environ.get('REDIS_PORT', 0),
             db=0,
             password= os.environ.get('REDIS_PWD', ""),
-            decode_responses=True,
+            decode_responses=False,  # Stored history may be in the binary codec format
             socket_timeout=30,
-            retry_on_timeout=True
+            retry_on_timeout=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=30
         )
+    try:
+        redis_client = redis.StrictRedis(connection_pool=_redis_pool)
 
         redis_client.ping()
+        _redis_client = redis_client
         return redis_client
     except redis.ConnectionError:
         return None
 
-def hash_value(value):
-    return hashlib.sha256(value.encode()).hexdigest() if isinstance(value, str) else hash_value(json.dumps(value))
+def reset_redis_client():
+    """Forget the reused client after a failed command, so the next get_redis_client() pings Redis again."""
+    global _redis_client
+    _redis_client = None
 
 # To extract type and securedSharedData from the contribution field of dataset shared
 # This data will be used for hashing as well as caching in Redis
-def process_secured_data(contributions):
+def process_secured_data(contributions, hash_version=HASH_VERSION_LEGACY):
     processed = []
+    hasher = get_hasher(hash_version)
     for entry in contributions:
         type = entry.get("type")
         secured_data = entry.get("securedSharedData")
         
         hashed_data = {
             key: (
-                {k: hash_value(v) for k, v in value.items()} if isinstance(value, dict) else
-                [hash_value(item) for item in value] if isinstance(value, list) else
-                hash_value(value)
+                {k: hasher(v) for k, v in value.items()} if isinstance(value, dict) else
+                [hasher(item) for item in value] if isinstance(value, list) else
+                hasher(value)
             )
             for key, value in secured_data.items()
         }
@@ -52,6 +85,59 @@ def process_secured_data(contributions):
         processed.append({"type": type, "securedSharedData": hashed_data})
     return processed
 
+def _process_streamed_contribution(reader, hasher):
+    """process_secured_data of the contribution at the reader, hashing list items as they are decoded."""
+    if reader.peek() != '{':
+        raise ValueError("Contribution is not an object")
+    task_type = hashed_data = None
+    for key in reader.iter_object():
+        if key != "securedSharedData":
+            value = reader.value()
+            if key == "type":
+                task_type = value
+            continue
+        if reader.peek() != '{':
+            raise ValueError("securedSharedData is not an object")
+        hashed_data = {}
+        for field in reader.iter_object():
+            kind = reader.peek()
+            if kind == '[':
+                hashed_data[field] = [hasher(reader.value()) for _ in reader.iter_array()]
+            elif kind == '{':
+                hashed_data[field] = {k: hasher(v) for k, v in reader.value().items()}
+            else:
+                hashed_data[field] = hasher(reader.value())
+    if hashed_data is None:
+        raise ValueError("Contribution has no securedSharedData")
+    return {"type": task_type, "securedSharedData": hashed_data}
+
+def process_secured_file(path, hash_version=HASH_VERSION_LEGACY):
+    """
+    Same as process_secured_data of the contributions of the JSON document at path, streamed.
+
+    Each list item of securedSharedData is hashed as soon as it is decoded and then dropped, so
+    memory depends on the largest single item and the hashes kept, not on the document size.
+    """
+    hasher = get_hasher(hash_version)
+    processed = []
+    with open_json_document(path) as json_file:
+        reader = JsonStream(json_file)
+        if reader.peek() != '{':
+            raise ValueError("Document is not an object")
+        for key in reader.iter_object():
+            if key != "contributions":
+                reader.value()
+            elif reader.peek() == '[':
+                processed = [_process_streamed_contribution(reader, hasher) for _ in reader.iter_array()]
+            else:
+                # Like iterating it: an empty string or object holds no contributions, anything else fails
+                contributions = reader.value()
+                if not isinstance(contributions, (str, dict)) or contributions:
+                    raise ValueError("contributions is not a list")
+                processed = []
+        reader.end()
+    return processed
+
 
 def compare_secured_data(processed_curr_data: list, processed_old_data: list):
     result = []
@@ -60,7 +146,7 @@ def compare_secured_data(processed_curr_data: list, processed_old_data: list):
     # Convert processed_curr_data to a dictionary for easier lookup
     curr_dict = {item["type"]: item["securedSharedData"] for item in processed_curr_data}
     old_dict = {item["type"]: item["securedSharedData"] for item in processed_old_data}
-    logging.info(f"curr_dict {curr_dict}, old_dict {old_dict}")
+    logging.info("curr_dict %s, old_dict %s", payload(curr_dict), payload(old_dict))
 
     # Process all types from curr_dict
     for type, curr_secured_data in curr_dict.items():
@@ -68,7 +154,7 @@ def compare_secured_data(processed_curr_data: list, processed_old_data: list):
         total_hashes = set()
         old_secured_data = old_dict.get(type, {})  # Get old data if available
 
-        logging.info(f"Processing types: {type}, curr_secured_data: {curr_secured_data}")
+        logging.info("Processing types: %s, curr_secured_data: %s", type, payload(curr_secured_data))
 
         # If type is not in old_dict, consider all hashes unique
         if type not in old_dict:
@@ -131,6 +217,37 @@ def compare_secured_data(processed_curr_data: list, processed_old_data: list):
         "total_normalized_score": total_normalized_score
     }
 
+class LastContributionAccumulator:
+    """
+    Folds earlier files for compare_secured_data.
+
+    compare_secured_data only looks at the last earlier contribution of each type, so that is all
+    this keeps. Files may arrive out of order; position (the index in file_list) decides which
+    contribution is the last one.
+    """
+
+    def __init__(self):
+        self._latest = {}
+        self.files = 0
+
+    def add(self, processed_file, position):
+        self.files += 1
+        for entry_idx, entry in enumerate(processed_file):
+            order = (position, entry_idx)
+            latest = self._latest.get(entry.get("type"))
+            if latest is None or order > latest[0]:
+                self._latest[entry.get("type")] = (order, entry.get("securedSharedData"))
+
+    def distinct_hashes(self):
+        return sum(len(flatten_hashes(secured_data or {})) for _, secured_data in self._latest.values())
+
+    def compare(self, processed_curr_data):
+        processed_old_data = [
+            {"type": task_type, "securedSharedData": secured_data}
+            for task_type, (_, secured_data) in self._latest.items()
+        ]
+        return compare_secured_data(processed_curr_data, processed_old_data)
+
 def get_unique_entries(comparison_results):
     """
     Extracts type and unique entry count from comparison results.
@@ -147,85 +264,97 @@ def get_unique_entries(comparison_results):
         for entry in comparison_results
     ]
 
-def download_file(file_url, save_path):
-    response = requests.get(file_url, stream=True)
-    
+def download_file(file_url, stop=None, deadline=None):
+    """
+    Open a streaming download of file_url.
+
+    :param stop: threading.Event that cancels the download, see http_client.request
+    :param deadline: time.perf_counter() value; no single connect or read may wait past it
+    :return: The response with its body not yet read, or None for any non-200 response
+    """
+    timeout = (http_client.CONNECT_TIMEOUT, http_client.READ_TIMEOUT)
+    if deadline is not None:
+        remaining = max(deadline - time.perf_counter(), MIN_DOWNLOAD_TIMEOUT)
+        timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+    response = http_client.get(file_url, stream=True, stop=stop, timeout=timeout)
+
     if response.status_code == 200:
-        with open(save_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-        return save_path  # File downloaded successfully
-    
+        response.raw.decode_content = True  # Undo any transfer compression while streaming
+        return response
+
+    response.close()
     return None  # Return None if file is not found or any other non-200 response
 
-def download_and_decrypt(file_url, signature):
-    try:
-        # Ensure the download folder exists
-        download_folder = "./download"
-        os.makedirs(download_folder, exist_ok=True)
-        
-        # Define paths
-        encrypted_file_path = os.path.join(download_folder, "encrypted_file.gpg")
-        decrypted_file_path = os.path.join(download_folder, "decrypted.json")
-        decrypted_zip_path = os.path.join(download_folder, "decrypted.zip")
-        extracted_folder = os.path.join(download_folder, "extracted")
+class StoppableStream:
+    """
+    Read-only stream that ends early, between chunks, once stop is set.
+
+    Reads return what has arrived so far (read1) instead of waiting for a full chunk, so a slow
+    download notices stop after at most one socket read.
+    """
+
+    def __init__(self, stream, stop):
+        self.stream = stream
+        self.stop = stop
+
+    def read(self, size=-1):
+        if self.stop.is_set():
+            return b""
+        read = getattr(self.stream, "read1", self.stream.read)  # urllib3 1.x has no read1
+        return read(size)
 
-        # Initialize GPG instance
+_gpg = None
+
+def get_gpg():
+    """
+    Return the process-wide GPG wrapper.
+
+    Creating one runs `gpg --version`, so it is done once per process rather than per file.
+    Every decryption still runs in its own gpg subprocess, so sharing it across threads is safe.
+    """
+    global _gpg
+    if _gpg is None:
+        import gnupg
         gpg = gnupg.GPG()
+        gpg.buffer_size = DOWNLOAD_CHUNK_SIZE
+        _gpg = gpg
+    return _gpg
 
-        # Download the encrypted file
-        result = download_file(file_url, encrypted_file_path)
-        if not result:  # Skip if download failed
-            return None  
+def download_and_decrypt(file_url, signature, workspace, stop=None, deadline=None):
+    """
+    Stream an encrypted file from file_url through GPG into workspace.
 
-        # Read encrypted content
-        with open(encrypted_file_path, 'rb') as encrypted_file:
-            encrypted_data = encrypted_file.read()
+    The HTTP body is piped into gpg in DOWNLOAD_CHUNK_SIZE pieces and gpg writes the plaintext
+    straight to disk, so neither the ciphertext nor the plaintext is ever held in memory. Setting
+    stop ends the download after the current chunk, and the truncated file fails to decrypt.
+    :return: Path of the decrypted file (a ZIP archive or a JSON document), or None on failure
+    """
+    try:
+        decrypted_file_path = os.path.join(workspace, "decrypted")
+
+        gpg = get_gpg()
 
-        # Decrypt the data
-        decrypted_data = gpg.decrypt(encrypted_data, passphrase=signature)
+        # Download the encrypted file
+        response = download_file(file_url, stop, deadline)
+        if not response:  # Skip if download failed
+            return None
+
+        with response:
+            stream = StoppableStream(response.raw, stop) if stop is not None else response.raw
+            decrypted_data = gpg.decrypt_file(stream, passphrase=signature, output=decrypted_file_path)
+            metrics.incr('http_bytes_in', response.raw.tell())
 
+        if stop is not None and stop.is_set():
+            return None
         if not decrypted_data.ok:
             raise Exception(f"Decryption failed: {decrypted_data.stderr}")
 
-        # Save decrypted output
-        with open(decrypted_zip_path, 'wb') as decrypted_file:
-            decrypted_file.write(decrypted_data.data)
-
-        # Check if the decrypted file is a ZIP archive
-        if zipfile.is_zipfile(decrypted_zip_path):
-            os.makedirs(extracted_folder, exist_ok=True)
-
-            with zipfile.ZipFile(decrypted_zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extracted_folder)
-            
-            # Find JSON file inside the extracted folder
-            json_file = None
-            for root, _, files in os.walk(extracted_folder):
-                for file in files:
-                    if file.endswith(".json"):
-                        json_file = os.path.join(root, file)
-                        break
-
-            if json_file:
-                print(f"Decryption successful, JSON extracted to {json_file}")
-                return json_file
-            else:
-                raise Exception("No JSON file found inside the decrypted ZIP")
-        else:
-            # If the decrypted output is not a ZIP, assume it's JSON
-            decrypted_json = json.loads(decrypted_data.data)
-            with open(decrypted_file_path, 'w') as json_file:
-                json.dump(decrypted_json, json_file, indent=2)
-
-            print(f"Decryption successful, saved to {decrypted_file_path}")
-            return decrypted_file_path
+        return decrypted_file_path
 
     except Exception as error:
         logging.warning(f"Error during decryption: {error}")
         return None
 
-
 # Fetch file mappings from API
 def generate_jwt_token(wallet_address: str, secret_key: str, expiration_time: int) -> str:
     """Generate a JWT token for a given wallet address."""
@@ -237,11 +366,17 @@ def generate_jwt_token(wallet_address: str, secret_key: str, expiration_time: in
     }
     
     # Encode the JWT
+    from jwt import encode as jwt_encode
     token = jwt_encode(payload, secret_key, algorithm='HS256')
     return token
 
 def get_file_details_from_wallet_address(wallet_address):
     """Fetch file mappings for a given wallet address with JWT authentication."""
+    file_list = fetch_file_details(wallet_address)
+    return file_list if file_list is not None else []  # Return empty list in case of an error
+
+def fetch_file_details(wallet_address):
+    """Like get_file_details_from_wallet_address, but returns None if the validator did not answer."""
     validator_base_api_url = os.environ.get('VALIDATOR_BASE_API_URL')
     secret_key = os.environ.get('JWT_SECRET_KEY')  # Retrieve the secret key from environment variables
     expiration_time = 600  # JWT expiration time in seconds (10 minutes)
@@ -260,85 +395,420 @@ def get_file_details_from_wallet_address(wallet_address):
         "Authorization": f"Bearer {jwt_token}"  # Attach JWT token
     }
 
-    response = requests.post(url, json=payload, headers=headers)  # Make POST request
+    # userinfo only reads file mappings, so it is safe to retry and hedge
+    response = http_client.post(url, json=payload, headers=headers, idempotent=True)
 
     if response.status_code == 200:
         return response.json()  # Return JSON response
-    else:
-        return []  # Return empty list in case of an error
-
-def main(curr_file_id, curr_input_data, file_list):
-    redis_client = get_redis_client()
-    processed_curr_data = process_secured_data(curr_input_data.get("contributions", []))
-    processed_old_data = []
-    sign = os.environ.get("SIGNATURE")
+    return None
+
+def fetch_history_file(file, signature, hash_version=HASH_VERSION_LEGACY, stop=None, deadline=None):
+    """
+    Download, decrypt and hash a single earlier file.
+
+    Every call works in its own temporary workspace, removed afterwards, so concurrent fetches
+    and concurrent proof runs never share files. stop and deadline are passed to download_and_decrypt.
+    :return: Processed contributions, or None if the file could not be fetched or was cancelled
+    """
+    file_url = file.get("fileUrl")
+    if not file_url or (stop is not None and stop.is_set()):
+        return None
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="history-") as workspace:
+            with metrics.span("download_decrypt"):
+                decrypted_path = download_and_decrypt(file_url, signature, workspace, stop, deadline)
+            if stop is not None and stop.is_set():
+                return None
+            if not decrypted_path:  # Skip if download failed
+                logging.warning(f"Skipping file {file_url} due to download error.")
+                metrics.incr('history_files_failed')
+                return None
+            logging.info(f"Download called for fileId: {file.get('fileId')}")
+            metrics.incr('history_files_downloaded')
+            with metrics.span("hash_history"):
+                return process_secured_file(decrypted_path, hash_version)
+    except Exception as error:
+        logging.warning(f"Skipping file {file_url} due to processing error: {error}")
+        return None
+
+def iter_history_until(file_list, signature, deadline=None, max_workers=DEFAULT_HISTORY_WORKERS, cache=None,
+                       hash_version=HASH_VERSION_LEGACY):
+    """
+    Download earlier files in file_list order, max_workers at a time, until a deadline.
+
+    Results are yielded as soon as each file is done, whatever its place in the list. Once
+    deadline (a time.perf_counter() value) passes, no new downloads are started and the ones in
+    flight are cancelled: they stop after their current chunk, and no socket read of theirs waits
+    past the deadline. They are joined before the generator returns, so no download outlives it.
+    Downloaded files are added to cache when one is given.
+    :return: Generator of (index in file_list, processed contributions or None if the file was skipped)
+    """
+    if not file_list:
+        return
+
+    stop = threading.Event()
+
+    def load(file):
+        processed = fetch_history_file(file, signature, hash_version, stop, deadline)
+        if cache and processed is not None and file.get("fileId"):
+            cache.put(versioned_key(file.get("fileId"), hash_version), processed)
+        return processed
+
+    queued = iter(enumerate(file_list))
+    max_workers = max(1, min(int(max_workers), len(file_list)))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        in_flight = {executor.submit(load, file): index for index, file in islice(queued, max_workers)}
+        while in_flight:
+            timeout = None if deadline is None else deadline - time.perf_counter()
+            if timeout is not None and timeout <= 0:
+                break
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                next_file = next(queued, None)
+                if next_file is not None:
+                    in_flight[executor.submit(load, next_file[1])] = next_file[0]
+                yield index, future.result()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def download_priority(file, position, curr_types):
+    """
+    Sort key that puts the earlier files most likely to matter first.
+
+    Files the validator lists with a type of the current file come first, when it lists types at
+    all. Then the most recent files: they overlap most with the current export, and the legacy
+    engine only compares against the last contribution of each type.
+    """
+    file_types = file.get("types") or ([file["type"]] if file.get("type") else [])
+    return (not (set(file_types) & curr_types), -position)
+
+def history_deadline(config):
+    """:return: time.perf_counter() value at which history loading stops, or None for no deadline"""
+    seconds = float(config.get('history_deadline') or 0)
+    return metrics.started + seconds if seconds > 0 else None
+
+def iter_history_cached(file_list, signature, deadline=None, max_workers=DEFAULT_HISTORY_WORKERS, cache=None,
+                        hash_version=HASH_VERSION_LEGACY):
+    """
+    Like iter_history_until, but files in the local history cache are yielded first, without a download.
+
+    :return: Generator of (index in file_list, processed contributions or None if the file was skipped)
+    """
+    not_cached = list(range(len(file_list)))
+    if cache:
+        not_cached = []
+        for index, file in enumerate(file_list):
+            file_id = file.get("fileId")
+            processed_file = cache.get(versioned_key(file_id, hash_version)) if file_id else None
+            if processed_file is None:
+                not_cached.append(index)
+            else:
+                yield index, processed_file
+        metrics.incr('history_cache_hits', len(file_list) - len(not_cached))
+        metrics.incr('history_cache_misses', len(not_cached))
+    downloads = iter_history_until(
+        [file_list[index] for index in not_cached], signature, deadline, max_workers, cache, hash_version
+    )
+    for idx, processed_file in downloads:
+        yield not_cached[idx], processed_file
+
+class RedisWriteBack:
+    """
+    Stores history files Redis did not have, so the next proof of the wallet finds them there.
+
+    SETs are pipelined REDIS_BATCH_SIZE at a time, encoded like the current file and with the
+    configured TTL. A failed write-back is logged and never fails the proof.
+    """
+
+    def __init__(self, redis_client, config=None):
+        config = config or {}
+        self.pipeline = redis_client.pipeline(transaction=False)
+        self.codec_name = config.get('history_codec', codec.CODEC_JSON)
+        self.compression = config.get('history_compression', 'none')
+        self.ttl = int(config.get('redis_history_ttl') or 0) or None
+        self.written = 0
+
+    def add(self, key, processed_file):
+        encoded = codec.encode(processed_file, self.codec_name, self.compression)
+        self.pipeline.set(key, encoded, ex=self.ttl)
+        metrics.incr('redis_bytes_out', len(encoded))
+        if len(self.pipeline) >= REDIS_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        queued = len(self.pipeline)
+        if not queued:
+            return
+        import redis
+        try:
+            with metrics.span("redis_writeback"):
+                self.pipeline.execute()
+        except redis.RedisError as error:
+            logging.warning(f"Redis write-back of {queued} history files failed: {error}")
+            self.pipeline.reset()
+            reset_redis_client()
+            return
+        self.written += queued
+        metrics.incr('redis_writebacks', queued)
+
+def new_history_accumulator(config):
+    """Create the accumulator that folds earlier files for the configured uniqueness engine."""
+    if config.get('uniqueness_engine') == 'vectorized':
+        from my_proof.vectorized_uniqueness import DigestSetAccumulator  # Loads numpy
+        return DigestSetAccumulator()
+    return LastContributionAccumulator()
+
+def check_near_duplicates(response, processed_curr_data, curr_file_id, wallet_address, config, redis_client=None):
+    """
+    Lower the scores of contributions that nearly duplicate another wallet's, if near_duplicate_index is set.
+
+    :return: (response, the file's signatures to index once the proof is known to be valid, or None)
+    """
+    if config.get('near_duplicate_index', 'none') == 'none':
+        return response, None
+    from my_proof.near_duplicates import apply_near_duplicates, contribution_signatures, get_near_duplicate_index  # Loads numpy
+    index = get_near_duplicate_index(config, redis_client)
+    if index is None:
+        logging.warning("Near-duplicate index is not available, skipping the cross-wallet check")
+        return response, None
+    import redis
+    try:
+        with metrics.span("near_duplicates"):
+            signatures = contribution_signatures(processed_curr_data)
+            response = apply_near_duplicates(
+                index, response, signatures, curr_file_id, wallet_address,
+                config.get('near_duplicate_threshold', 0.5), config.get('near_duplicate_top_k', 5)
+            )
+    except redis.RedisError as error:
+        logging.warning(f"Near-duplicate check failed, skipping it: {error}")
+        reset_redis_client()
+        return response, None
+    return response, signatures
+
+def index_near_duplicates(config, signatures, curr_file_id, wallet_address):
+    """Add a file that passed ownership and authenticity to the near-duplicate index."""
+    if not signatures:
+        return
+    from my_proof.near_duplicates import add_to_near_duplicate_index, get_near_duplicate_index
+    index = get_near_duplicate_index(config, get_redis_client() if config.get('near_duplicate_index') == 'redis' else None)
+    if index is None:
+        return
+    import redis
+    try:
+        with metrics.span("near_duplicates_index"):
+            add_to_near_duplicate_index(index, signatures, curr_file_id, wallet_address)
+    except redis.RedisError as error:
+        logging.warning(f"Could not add the file to the near-duplicate index: {error}")
+        reset_redis_client()
+
+def main(curr_file_id, curr_input_data, file_list, config=None):
+    config = config or {}
+    with metrics.span("redis_connect"):
+        redis_client = get_redis_client()
+    import redis
+    hash_version = int(config.get('hash_version', HASH_VERSION_LEGACY))
+    with metrics.span("hash_current"):
+        processed_curr_data = process_secured_data(curr_input_data.get("contributions", []), hash_version)
+    sign = config.get('signature') or os.environ.get("SIGNATURE")
+    max_workers = config.get('history_workers', DEFAULT_HISTORY_WORKERS)
+    history_cache = get_history_cache(config)
+    curr_key = history_key(curr_file_id, hash_version)
+    encoded_curr_data = codec.encode(
+        processed_curr_data, config.get('history_codec', codec.CODEC_JSON), config.get('history_compression', 'none')
+    )
+
+    if redis_client and config.get('uniqueness_mode') == 'index':
+        # A Redis failure here falls back to comparing against downloaded history, like a proof
+        # without Redis
+        try:
+            wallet_address = curr_input_data.get("walletAddress")
+            use_global = config.get('uniqueness_global_index', False)
+            with metrics.span("index_backfill"):
+                coverage = backfill_wallet_index(
+                    redis_client, wallet_address, file_list,
+                    lambda files: iter_history_cached(
+                        files, sign, history_deadline(config), max_workers, history_cache, hash_version
+                    ),
+                    use_global, hash_version
+                )
+            with metrics.span("index_compare"):
+                response = index_uniqueness(
+                    redis_client, wallet_address, curr_file_id, processed_curr_data, use_global, hash_version
+                )
+            response, signatures = check_near_duplicates(
+                response, processed_curr_data, curr_file_id, wallet_address, config, redis_client
+            )
+            # Keep the per-file blob so blob mode readers still see this file
+            with metrics.span("redis_write"):
+                redis_client.set(curr_key, encoded_curr_data)
+            return {
+                "avg_score": response["total_normalized_score"],
+                "result": response["comparison_results"],
+                "coverage": coverage,
+                "near_duplicate_signatures": signatures,
+            }
+        except redis.RedisError as error:
+            logging.warning(f"Redis failed in index mode, falling back to downloads: {error}")
+            reset_redis_client()
+            redis_client = None
+
+    # Earlier files are folded into the accumulator one at a time, as soon as each arrives, so
+    # only the merged hashes are kept in memory and not every file's processed contributions
+    accumulator = new_history_accumulator(config)
+    coverage = {"files_total": len(file_list), "redis_hits": 0, "cache_hits": 0, "downloaded": 0, "failed": 0}
+    missing = list(range(len(file_list)))
+    writeback = RedisWriteBack(redis_client, config) if redis_client and config.get('redis_writeback', True) else None
     if redis_client:
-        pipeline = redis_client.pipeline()
-        for file in file_list:
-            pipeline.get(file.get("fileId"))
-        stored_data_list = pipeline.execute()
-
-        for idx, stored_data in enumerate(stored_data_list):
-            if stored_data:
-                # If the data exists in Redis, process it
-                processed_old_data.extend(json.loads(stored_data))
-                
+        missing = []
+        for start in range(0, len(file_list), REDIS_BATCH_SIZE):
+            batch = file_list[start:start + REDIS_BATCH_SIZE]
+            pipeline = redis_client.pipeline()
+            for file in batch:
+                pipeline.get(history_key(file.get("fileId"), hash_version))
+
+            try:
+                with metrics.span("redis_read"):
+                    stored_batch = pipeline.execute()
+            except redis.RedisError as error:
+                # Files Redis did not answer for are downloaded, as without Redis
+                logging.warning(f"Redis read failed, downloading the remaining history: {error}")
+                reset_redis_client()
+                redis_client = writeback = None
+                missing.extend(range(start, len(file_list)))
+                break
+            for position, stored_data in enumerate(stored_batch, start):
+                if stored_data:
+                    # If the data exists in Redis, process it
+                    metrics.incr('redis_hits')
+                    metrics.incr('redis_bytes_in', len(stored_data))
+                    accumulator.add(codec.decode(stored_data), position)
+                    coverage["redis_hits"] += 1
+                else:
+                    metrics.incr('redis_misses')
+                    missing.append(position)
+
+    # Local cache hits cost a disk read, so all of them are folded before any download starts
+    if history_cache and missing:
+        not_cached = []
+        with metrics.span("history_cache"):
+            for position in missing:
+                file_id = file_list[position].get("fileId")
+                processed_file = history_cache.get(versioned_key(file_id, hash_version)) if file_id else None
+                if processed_file is None:
+                    not_cached.append(position)
+                else:
+                    accumulator.add(processed_file, position)
+                    coverage["cache_hits"] += 1
+                    if writeback:
+                        writeback.add(history_key(file_id, hash_version), processed_file)
+        metrics.incr('history_cache_hits', coverage["cache_hits"])
+        metrics.incr('history_cache_misses', len(not_cached))
+        missing = not_cached
+
+    # Download the rest, most valuable first, until the deadline
+    curr_types = {entry.get("type") for entry in processed_curr_data}
+    missing.sort(key=lambda position: download_priority(file_list[position], position, curr_types))
+    with metrics.span("history"):
+        downloads = iter_history_until(
+            [file_list[position] for position in missing], sign, history_deadline(config), max_workers, history_cache,
+            hash_version
+        )
+        for idx, processed_file in downloads:
+            if processed_file is None:
+                coverage["failed"] += 1
             else:
-                # If data is not found in Redis, download and process the file
-                file_url = file_list[idx].get("fileUrl")
-                if file_url:
-                    decrypted_data = download_and_decrypt(file_url, sign)
-                    if not decrypted_data:  # Skip if download failed
-                        logging.warning(f"Skipping file {file_url} due to download error.")
-                        continue  # Move to the next file
-                    logging.info(f"Download called for fileId: {file_list[idx].get('fileId')}")
-                    # Load data from the downloaded JSON file
-                    with open(decrypted_data, 'r', encoding="utf-8") as json_file:
-                        downloaded_data = json.load(json_file)
-                    # Process and append the new data
-                    processed_old_data += process_secured_data(downloaded_data.get("contributions"))
-
-        logging.info(f"Processed Redis data: {processed_old_data}")
-
-    else:
-        # If no Redis client is available, download files from the list
-        for file in file_list:
-            file_url = file.get("fileUrl")
-            if file_url:
-                decrypted_data = download_and_decrypt(file_url, sign)
-                if not decrypted_data:  # Skip if download failed
-                        logging.warning(f"Skipping file {file_url} due to download error.")
-                        continue  # Move to the next file
-                logging.info(f"Download called for file: {file_url}")
-                # Load data from the decrypted JSON file
-                with open(decrypted_data, 'r', encoding="utf-8") as json_file:
-                    downloaded_data = json.load(json_file)
-                processed_old_data += process_secured_data(downloaded_data.get("contributions"))
+                accumulator.add(processed_file, missing[idx])
+                coverage["downloaded"] += 1
+                file_id = file_list[missing[idx]].get("fileId")
+                if writeback and file_id:
+                    writeback.add(history_key(file_id, hash_version), processed_file)
+
+    coverage["not_loaded"] = len(missing) - coverage["downloaded"] - coverage["failed"]
+    coverage["files_considered"] = accumulator.files
+    coverage["deadline_reached"] = coverage["not_loaded"] > 0
+    if coverage["deadline_reached"]:
+        logging.warning(f"History deadline reached, {coverage['not_loaded']} earlier files not loaded")
+    logging.info("Folded %s earlier files, %s distinct hashes kept", accumulator.files, lazy(accumulator.distinct_hashes))
 
     # Store current data in Redis if available
     if redis_client:
-        redis_client.set(curr_file_id, json.dumps(processed_curr_data))
+        try:
+            with metrics.span("redis_write"):
+                redis_client.set(curr_key, encoded_curr_data)
+        except redis.RedisError as error:
+            logging.warning(f"Could not store the current file in Redis: {error}")
+            reset_redis_client()
+            redis_client = None
+    if writeback:
+        writeback.flush()
+        logging.info(f"Wrote {writeback.written} earlier files back to Redis")
 
     # Compare current and old data
-    response = compare_secured_data(processed_curr_data, processed_old_data)
+    with metrics.span("compare"):
+        response = accumulator.compare(processed_curr_data)
+    response, signatures = check_near_duplicates(
+        response, processed_curr_data, curr_file_id, curr_input_data.get("walletAddress"), config, redis_client
+    )
 
     # Return the processed data
     return {
         "avg_score": response["total_normalized_score"], 
-        "result": response["comparison_results"] 
+        "result": response["comparison_results"],
+        "coverage": coverage,
+        "near_duplicate_signatures": signatures,
     }
 
-def uniqueness_helper(curr_input_data):
+def store_current_file(curr_file_id, curr_input_data, config=None):
+    """
+    Store the current file's processed hashes in Redis without scoring it, for a proof that skipped uniqueness.
+
+    Later proofs of the wallet then read the file from Redis instead of downloading it. That holds
+    in index mode too, whose backfill reads the same per-file key.
+    """
+    config = config or {}
+    redis_client = get_redis_client() if curr_file_id else None
+    if not redis_client:
+        return
+    hash_version = int(config.get('hash_version', HASH_VERSION_LEGACY))
+    with metrics.span("hash_current"):
+        processed_curr_data = process_secured_data(curr_input_data.get("contributions", []), hash_version)
+    encoded_curr_data = codec.encode(
+        processed_curr_data, config.get('history_codec', codec.CODEC_JSON), config.get('history_compression', 'none')
+    )
+    import redis
+    try:
+        with metrics.span("redis_write"):
+            redis_client.set(history_key(curr_file_id, hash_version), encoded_curr_data)
+    except redis.RedisError as error:
+        logging.warning(f"Could not store the current file in Redis: {error}")
+        reset_redis_client()
+
+def uniqueness_helper(curr_input_data, config=None, file_list=None):
+    """:param file_list: The wallet's earlier files, if already fetched from /api/userinfo"""
     wallet_address = curr_input_data.get('walletAddress')
-    file_list = get_file_details_from_wallet_address(wallet_address) 
-    logging.info(f"File list: {file_list}")
-    curr_file_id = os.environ.get('FILE_ID') 
+    if file_list is None:
+        start = time.perf_counter()
+        with metrics.span("userinfo"):
+            file_list = get_file_details_from_wallet_address(wallet_address)
+        logging.info(f"Stage userinfo finished in {time.perf_counter() - start:.3f}s")
+    logging.info("File list: %s", payload(file_list))
+    curr_file_id = (config or {}).get('file_id') or os.environ.get('FILE_ID')
     logging.info(f"Current file id: {curr_file_id}")
-    response = main(curr_file_id, curr_input_data, file_list)
+    start = time.perf_counter()
+    response = main(curr_file_id, curr_input_data, file_list, config)
+    logging.info(f"Stage history + compare finished in {time.perf_counter() - start:.3f}s")
     res = {
         "unique_entries": get_unique_entries(response.get("result")),
-        "uniqueness_score": response.get("avg_score")
+        "uniqueness_score": response.get("avg_score"),
+        "coverage": response.get("coverage"),
+        "near_duplicates": {
+            entry["type"]: entry["near_duplicates"] for entry in response.get("result") or [] if entry.get("near_duplicates")
+        },
+        # Indexed by Proof.score_input, once ownership and authenticity are known
+        "near_duplicate_signatures": response.get("near_duplicate_signatures"),
     }
     return res
-
-
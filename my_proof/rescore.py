@@ -0,0 +1,292 @@
+"""
+Offline re-scoring of already processed files, e.g. after a change to the points table or to
+the tiers of get_dynamic_task_score.
+
+Each file is a scoring record holding everything Proof.calculate_individual_scores reads:
+
+    {"file_id": ..., "ownership": 1.0,
+     "contributions": [{"type": "UBER", "witnesses": "wss://attestor.reclaimprotocol.org/..."}],
+     "unique_entries": [{"type": "UBER", "unique_entry_count": 12, "type_unique_score": 0.8}]}
+
+Batch mode writes one as "scoring_record" on every line of its JSONL output. Ownership and
+uniqueness are kept from the original run, because they depend on the validator and on the
+history at that time. Quality, authenticity, type points and the final score are recomputed for
+all files at once, as column operations over one row per file and contribution type:
+
+    python -m my_proof.rescore --input records.jsonl [--output results.jsonl] [--results-dir DIR]
+                               [--points points.json] [--verify 1000]
+
+Input lines can be scoring records or batch output lines. --points replaces the points table
+for the run. --verify N also scores the first N files on the scalar path and exits with 1 if
+any result differs.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from my_proof import proof_of_quality
+from my_proof.log_utils import configure_logging
+from my_proof.proof import VALID_DOMAINS, Proof
+
+PARITY_TOLERANCE = 1e-9
+RESULT_FIELDS = ('ownership', 'uniqueness', 'quality', 'authenticity', 'score')
+
+
+def load_records(path):
+    """:return: Scoring records from a JSONL file of records or of batch output lines"""
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            record = entry.get('scoring_record') if 'scoring_record' in entry else entry
+            if not record or 'contributions' not in record:
+                logging.warning(f"Line {line_number} has no scoring record, skipped")
+                continue
+            records.append(dict(record, file_id=entry.get('file_id', record.get('file_id'))))
+    return records
+
+
+def witness_is_valid(witnesses, valid_domains):
+    """Authenticity of one contribution, as Proof.calculate_type_authenticity_scores computes it."""
+    return 1 if any(domain in witnesses for domain in valid_domains) else 0
+
+def build_frames(records):
+    """
+    :return: (one row per file and contribution type, one row per file). Like the scalar path, the
+             last contribution and the last unique entry of a type in a file are the ones used.
+    """
+    contributions = [contribution for record in records for contribution in record['contributions']]
+    witnesses = [contribution.get('witnesses', '') for contribution in contributions]
+    # Lists and dicts are checked by membership either way, and tuples can be factorized
+    witnesses = [tuple(value) if isinstance(value, (list, dict)) else value for value in witnesses]
+    entries = [record.get('unique_entries') or [] for record in records]
+    flat_entries = [entry for record_entries in entries for entry in record_entries]
+    contribution_types = [contribution.get('type') for contribution in contributions]
+    # One code per distinct type, so (file, type) pairs become single integer keys
+    type_codes, types = pd.factorize(np.array(contribution_types + [entry['type'] for entry in flat_entries], dtype=object))
+    contribution_keys = (
+        np.repeat(np.arange(len(records)), [len(record['contributions']) for record in records]) * len(types)
+        + type_codes[:len(contributions)]
+    )
+    entry_keys = (
+        np.repeat(np.arange(len(records)), [len(record_entries) for record_entries in entries]) * len(types)
+        + type_codes[len(contributions):]
+    )
+
+    rows = pd.DataFrame({'key': contribution_keys, 'type': contribution_types, 'witnesses': witnesses})
+    rows = rows.drop_duplicates('key', keep='last')
+    unique_entries = pd.DataFrame({
+        'unique_entry_count': np.array([entry['unique_entry_count'] for entry in flat_entries], dtype=float),
+        'type_unique_score': np.array([entry['type_unique_score'] for entry in flat_entries], dtype=float),
+    }, index=entry_keys)
+    unique_entries = unique_entries[~unique_entries.index.duplicated(keep='last')]
+    rows = rows.join(unique_entries, on='key')
+    rows['file'] = rows['key'] // max(len(types), 1)
+
+    # The scalar path raises on witnesses it cannot search, e.g. null, even on a contribution that
+    # a later one of the same type replaces
+    unsearchable = np.fromiter((not isinstance(value, (str, tuple)) for value in witnesses), dtype=bool,
+                               count=len(witnesses))
+    files = pd.DataFrame({
+        'file_id': [record.get('file_id') for record in records],
+        'ownership': pd.to_numeric([record.get('ownership') for record in records], errors='coerce'),
+        'unsearchable_witnesses': np.isin(np.arange(len(records)), contribution_keys[unsearchable] // max(len(types), 1)),
+    })
+    return rows, files
+
+def score_frames(rows, files, points, valid_domains):
+    """
+    Vectorized calculate_quality_n_type_score and calculate_individual_scores.
+
+    :return: files with uniqueness, quality, authenticity, score, valid and error columns
+    """
+    max_point = rows['type'].map(points).to_numpy(dtype=float)
+    counts = rows['unique_entry_count'].to_numpy(dtype=float)
+    share = np.zeros(len(rows))
+    for min_count, tier_share in reversed(proof_of_quality.DYNAMIC_SCORE_TIERS):
+        share = np.where(counts >= min_count, tier_share, share)
+
+    is_count_type = rows['type'].isin(proof_of_quality.COUNT_SCORED_TYPES).to_numpy()
+    is_share_type = rows['type'].isin(proof_of_quality.SHARE_SCORED_TYPES).to_numpy()
+    scored_type = is_count_type | is_share_type
+    type_points = np.select(
+        [is_count_type, is_share_type],
+        [max_point * share, max_point * rows['type_unique_score'].to_numpy(dtype=float)],
+        0.0,
+    )
+    quality = np.zeros(len(rows))
+    np.divide(type_points, max_point, out=quality, where=scored_type & (max_point > 0))
+    rows = rows.assign(type_points=type_points, quality=quality)
+
+    # Most files share a handful of witness URLs, so each distinct value is checked once. Null
+    # witnesses get a code of their own instead of -1, which would index the last distinct value.
+    codes, distinct = pd.factorize(rows['witnesses'], use_na_sentinel=False)
+    valid_witnesses = np.fromiter(
+        (witness_is_valid(value, valid_domains) if isinstance(value, (str, tuple)) else 0 for value in distinct),
+        dtype=float, count=len(distinct)
+    )
+    authenticity = valid_witnesses[codes]
+    rows = rows.assign(authenticity=authenticity)
+
+    # Cases where the scalar path raises: a type without unique entry details, or a scored type
+    # missing from the points table
+    rows = rows.assign(error=np.where(
+        rows['unique_entry_count'].isna(), "no unique entry details",
+        np.where(scored_type & np.isnan(max_point), "type missing from the points table", None)
+    ))
+
+    per_file = rows.groupby('file').agg(
+        uniqueness=('type_unique_score', 'mean'),
+        quality=('quality', 'mean'),
+        authenticity=('authenticity', 'mean'),
+        type_points=('type_points', 'sum'),
+        error=('error', 'first'),
+    )
+    files = files.join(per_file)
+    files['score'] = files['type_points'] / proof_of_quality.calculate_max_points(points)
+    files['valid'] = files['authenticity'] >= 1.0
+    files['error'] = files['error'].where(files['uniqueness'].notna() | files['error'].notna(), "no contributions")
+    files['error'] = files['error'].where(~files['unsearchable_witnesses'], "witnesses are not a string or list")
+    return files.drop(columns=['type_points', 'unsearchable_witnesses'])
+
+def rescore(records, points=None, valid_domains=None, dlp_id=24):
+    """:return: One {"file_id", "result"} or {"file_id", "error"} per record, in input order"""
+    points = proof_of_quality.points if points is None else points
+    valid_domains = VALID_DOMAINS if valid_domains is None else valid_domains
+    rows, files = build_frames(records)
+    scored = score_frames(rows, files, points, valid_domains)
+
+    results = []
+    columns = [scored[name].tolist() for name in ('file_id', 'error', 'valid') + RESULT_FIELDS]
+    for file_id, error, valid, ownership, uniqueness, quality, authenticity, score in zip(*columns):
+        if isinstance(error, str):
+            results.append({"file_id": file_id, "error": error})
+            continue
+        results.append({"file_id": file_id, "result": {
+            'dlp_id': dlp_id,
+            'valid': valid,
+            'ownership': ownership,
+            'uniqueness': uniqueness,
+            'quality': quality,
+            'authenticity': authenticity,
+            'score': score,
+        }})
+    return results
+
+def score_record_scalar(record, dlp_id=24):
+    """Score one record with Proof.calculate_individual_scores, as a proof run does."""
+    config = {'dlp_id': dlp_id}
+    proof = Proof(config)
+    proof.proof_response_object['ownership'] = record.get('ownership')
+    # securedSharedData is not part of the record; scoring requires the key but never reads it
+    contributions = [dict(contribution, securedSharedData=None) for contribution in record['contributions']]
+    final_scores = proof.calculate_individual_scores(
+        {'contributions': contributions}, config, record.get('unique_entries') or [], valid_domains=VALID_DOMAINS
+    )
+    result = dict(proof.proof_response_object)
+    result['uniqueness'] = final_scores['uniqueness_score']
+    result['quality'] = final_scores['quality_score']
+    result['authenticity'] = final_scores['authenticity_score']
+    result['score'] = final_scores['score']
+    if result['authenticity'] < 1.0:
+        result['valid'] = False
+    return result
+
+def verify_parity(records, results):
+    """:return: file_ids whose columnar result differs from the scalar path"""
+    mismatches = []
+    for record, columnar in zip(records, results):
+        try:
+            scalar = score_record_scalar(record)
+        except (KeyError, TypeError, ZeroDivisionError):
+            scalar = None
+        if scalar is None or 'error' in columnar:
+            if (scalar is None) != ('error' in columnar):
+                mismatches.append(record.get('file_id'))
+            continue
+        expected = columnar['result']
+        if scalar['valid'] != expected['valid'] or any(
+            not math.isclose(scalar[field], expected[field], rel_tol=0, abs_tol=PARITY_TOLERANCE) for field in RESULT_FIELDS
+        ):
+            mismatches.append(record.get('file_id'))
+    return mismatches
+
+
+def result_path(results_dir, file_id):
+    """:return: Path of the <file_id>.json result, or None if file_id is missing or not a plain file name"""
+    name = str(file_id) if file_id is not None else ''
+    if name in ('', '.', '..') or os.path.basename(name) != name or (os.altsep and os.altsep in name):
+        return None
+    return os.path.join(results_dir, f"{name}.json")
+
+def write_results(results, output=None, results_dir=None):
+    if results_dir:
+        os.makedirs(results_dir, exist_ok=True)
+    out = open(output, 'w', encoding='utf-8') if output else None
+    try:
+        for line in results:
+            if out:
+                out.write(json.dumps(line) + "\n")
+            if results_dir and 'result' in line:
+                path = result_path(results_dir, line['file_id'])
+                if path is None:
+                    logging.warning(f"Result of file_id {line['file_id']!r} not written to {results_dir}: not a valid file name")
+                    continue
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(line['result'], f, indent=2)
+    finally:
+        if out:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score processed files with the current scoring tables")
+    parser.add_argument('--input', required=True, help="JSON lines of scoring records or batch output")
+    parser.add_argument('--output', help="JSON lines file with one result per file")
+    parser.add_argument('--results-dir', help="Directory for one <file_id>.json result per file")
+    parser.add_argument('--points', help="JSON file with a points table to use instead of the current one")
+    parser.add_argument('--verify', type=int, default=0, metavar="N",
+                        help="Also score the first N files on the scalar path and fail on any difference")
+    args = parser.parse_args()
+    if not args.output and not args.results_dir:
+        parser.error("give --output, --results-dir or both")
+
+    if args.points:
+        with open(args.points, 'r', encoding='utf-8') as f:
+            # Replaced in place, so get_dynamic_task_score and the scalar check see the same table
+            new_points = json.load(f)
+        proof_of_quality.points.clear()
+        proof_of_quality.points.update(new_points)
+
+    records = load_records(args.input)
+    start = time.perf_counter()
+    results = rescore(records)
+    elapsed = time.perf_counter() - start
+    write_results(results, args.output, args.results_dir)
+    failed = sum(1 for line in results if 'error' in line)
+    logging.info(f"Re-scored {len(results) - failed} files, {failed} failed, "
+                 f"{len(results) / elapsed if elapsed else 0:.0f} files/s")
+
+    if args.verify:
+        logging.disable(logging.INFO)  # The scalar path logs every type of every file
+        mismatches = verify_parity(records[:args.verify], results[:args.verify])
+        logging.disable(logging.NOTSET)
+        if mismatches:
+            logging.error(f"{len(mismatches)} files differ from the scalar path, e.g. {mismatches[:5]}")
+            return 1
+        logging.info(f"First {min(args.verify, len(records))} files match the scalar path")
+    return 0
+
+
+if __name__ == "__main__":
+    configure_logging()
+    sys.exit(main())
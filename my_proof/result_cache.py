@@ -0,0 +1,140 @@
+"""
+Memoized proof results, so a retried job for the same FILE_ID returns without redoing the work.
+
+A result is stored under a digest of everything it depends on:
+
+- RESULT_CACHE_VERSION, bumped by hand whenever a code change alters results for the same inputs;
+- the fileId;
+- the input document, as canonical JSON;
+- the scoring tables (points per type, valid witness domains, bonus thresholds);
+- the configuration entries in SCORING_CONFIG_KEYS;
+- the wallet's earlier fileIds from /api/userinfo, without the current file.
+
+Any change to one of these gives a new key, so a stale result is never looked up; old entries
+simply expire. Other settings, like worker counts, timeouts and logging, do not change results
+and are left out.
+
+Only complete results are stored: ownership was confirmed, and the result reports history
+coverage showing every earlier file was loaded, with no failed downloads and no history deadline
+hit. Each entry holds the result and its scoring record, see Proof.scoring_record. Results that may come from a transient
+failure are recomputed on the retry. Entries expire after RESULT_CACHE_TTL seconds. The sealed
+cache is also bounded in size, and its least recently used entries are evicted first.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+from my_proof.history_cache import DEFAULT_MAX_BYTES, HistoryCache
+from my_proof.uniqueness_index import INDEX_PREFIX
+
+RESULT_CACHE_VERSION = 2
+RESULT_CACHE_FOLDER = "result_cache"
+DEFAULT_TTL = 24 * 60 * 60
+SCORING_CONFIG_KEYS = (
+    'dlp_id', 'hash_version', 'uniqueness_engine', 'uniqueness_mode', 'uniqueness_global_index',
+    'lazy_scoring', 'score_tolerance', 'near_duplicate_index', 'near_duplicate_threshold', 'near_duplicate_top_k',
+)
+
+
+def canonical_digest(value) -> str:
+    """SHA-256 of value as canonical JSON, independent of key order and whitespace."""
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+def history_fingerprint(file_list, curr_file_id=None) -> str:
+    """Digest of the wallet's earlier fileIds. The current file is left out, since the validator may list it on a retry."""
+    file_ids = sorted({str(file.get("fileId")) for file in file_list or [] if file.get("fileId") is not None})
+    return canonical_digest([file_id for file_id in file_ids if file_id != str(curr_file_id)])
+
+def result_cache_key(input_data, config, file_list, scoring_tables, curr_file_id=None) -> str:
+    """
+    :param scoring_tables: The points table, valid domains and other constants the scores are computed from
+    :return: Cache key of the result of scoring input_data with this configuration and history
+    """
+    return canonical_digest({
+        "version": RESULT_CACHE_VERSION,
+        "file_id": curr_file_id,
+        "input": canonical_digest(input_data),
+        "scoring": scoring_tables,
+        "config": {key: config.get(key) for key in SCORING_CONFIG_KEYS},
+        "history": history_fingerprint(file_list, curr_file_id),
+    })
+
+def is_cacheable(result) -> bool:
+    """
+    Whether result is complete. A result that may reflect a transient failure is not cached, nor is
+    one without history coverage, since then it is unknown how much history it was computed on.
+    """
+    coverage = (result.get('attributes') or {}).get('history_coverage')
+    return (
+        result.get('ownership') == 1.0
+        and coverage is not None
+        and not coverage.get('failed')
+        and not coverage.get('deadline_reached')
+    )
+
+
+class RedisResultCache:
+    """Results shared by every worker through Redis, expired by Redis."""
+
+    def __init__(self, redis_client, ttl=DEFAULT_TTL):
+        self.redis = redis_client
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(key):
+        return f"{INDEX_PREFIX}:proof:{key}"
+
+    def get(self, key):
+        import redis
+        try:
+            stored = self.redis.get(self._key(key))
+        except redis.RedisError as error:
+            logging.warning(f"Result cache lookup failed: {error}")
+            return None
+        return json.loads(stored) if stored else None
+
+    def put(self, key, result):
+        import redis
+        try:
+            self.redis.set(self._key(key), json.dumps(result), ex=self.ttl or None)
+        except redis.RedisError as error:
+            logging.warning(f"Could not store the result: {error}")
+
+
+class SealedResultCache:
+    """Results kept in the sealed directory, expired by their age when read."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.entries = HistoryCache(directory, max_bytes)
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if not isinstance(entry, dict) or 'result' not in entry:
+            return None
+        if self.ttl and time.time() - entry.get('stored_at', 0) > self.ttl:
+            return None
+        return entry['result']
+
+    def put(self, key, result):
+        self.entries.put(key, {'stored_at': time.time(), 'result': result})
+
+
+def get_result_cache(config, redis_client=None):
+    """:return: The cache configured by result_cache ('redis' or 'sealed'), or None if it is off or unavailable"""
+    backend = config.get('result_cache', 'none')
+    ttl = int(config.get('result_cache_ttl', DEFAULT_TTL))
+    if backend == 'redis':
+        return RedisResultCache(redis_client, ttl) if redis_client else None
+    if backend == 'sealed' and config.get('use_sealing') and config.get('sealed_dir'):
+        try:
+            return SealedResultCache(
+                os.path.join(config['sealed_dir'], RESULT_CACHE_FOLDER),
+                int(config.get('history_cache_max_bytes', DEFAULT_MAX_BYTES)), ttl
+            )
+        except OSError as error:
+            logging.warning(f"Result cache disabled: {error}")
+    return None
@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import sys
+import zlib
+
+from my_proof import codec
+from my_proof.hashing import HASH_VERSION_LEGACY, versioned_key
+
+# Prefix of every key the proof reads or writes, e.g. "dlp24:", so several DLPs can share one Redis
+REDIS_NAMESPACE = os.environ.get('REDIS_NAMESPACE', '')
+INDEX_PREFIX = f"{REDIS_NAMESPACE}uniq"
+CHUNK_SIZE = 5000  # Max members per SMISMEMBER/SADD call
+SCAN_COUNT = 1000  # Keys per SCAN page of the global backfill
+
+
+def history_key(file_id, hash_version=HASH_VERSION_LEGACY):
+    """Key of a file's processed hashes, the per-file blob of blob mode."""
+    return REDIS_NAMESPACE + versioned_key(file_id, hash_version)
+
+# Each hash format version gets its own sets, see hashing.versioned_key
+def wallet_set_key(wallet_address, task_type, hash_version=HASH_VERSION_LEGACY):
+    return versioned_key(f"{INDEX_PREFIX}:wallet:{str(wallet_address).lower()}:{task_type}", hash_version)
+
+def global_set_key(task_type, hash_version=HASH_VERSION_LEGACY):
+    return versioned_key(f"{INDEX_PREFIX}:global:{task_type}", hash_version)
+
+def indexed_files_key(wallet_address, hash_version=HASH_VERSION_LEGACY):
+    return versioned_key(f"{INDEX_PREFIX}:wallet:{str(wallet_address).lower()}:files", hash_version)
+
+def file_result_key(file_id, hash_version=HASH_VERSION_LEGACY):
+    return versioned_key(f"{INDEX_PREFIX}:file:{file_id}:result", hash_version)
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def flatten_hashes(secured_data):
+    """Collect every hash of a processed securedSharedData dict into one set."""
+    hashes = set()
+    for value in secured_data.values():
+        if isinstance(value, dict):
+            hashes.update(value.values())
+        elif isinstance(value, list):
+            hashes.update(value)
+        elif isinstance(value, str):
+            hashes.add(value)
+    return hashes
+
+def hashes_by_type(processed_data):
+    """Merge the hashes of processed contributions per contribution type."""
+    merged = {}
+    for entry in processed_data:
+        merged.setdefault(entry.get("type"), set()).update(flatten_hashes(entry.get("securedSharedData") or {}))
+    return merged
+
+def add_to_index(pipeline, wallet_address, processed_data, use_global=False, hash_version=HASH_VERSION_LEGACY):
+    """Queue SADD commands that fold processed contributions into the hash sets."""
+    for task_type, hashes in hashes_by_type(processed_data).items():
+        for chunk in _chunks(list(hashes)):
+            pipeline.sadd(wallet_set_key(wallet_address, task_type, hash_version), *chunk)
+            if use_global:
+                pipeline.sadd(global_set_key(task_type, hash_version), *chunk)
+
+
+def backfill_wallet_index(redis_client, wallet_address, file_list, load_missing=None, use_global=False,
+                          hash_version=HASH_VERSION_LEGACY):
+    """
+    One-time migration of a wallet's per-file blobs into its hash sets.
+
+    Files already folded in are tracked in a set of fileIds, so each file is migrated once.
+    Files whose blob is not in Redis are passed to load_missing when given: a callable yielding
+    (index in the files it got, processed contributions or None if skipped), like
+    iter_history_until. Files it never yields, e.g. because a deadline passed, are left for the
+    wallet's next proof.
+    :return: Coverage of the wallet's history: files_total, skipped (no fileId), already_indexed,
+             redis_hits, downloaded (by load_missing, including its local cache hits), failed (no data,
+             so not in the index), not_loaded,
+             files_considered and deadline_reached
+    """
+    coverage = {"files_total": len(file_list), "skipped": 0, "already_indexed": 0, "redis_hits": 0, "downloaded": 0,
+                "failed": 0, "not_loaded": 0, "files_considered": 0, "deadline_reached": False}
+    file_list = [file for file in file_list if file.get("fileId")]
+    coverage["skipped"] = coverage["files_total"] - len(file_list)
+    if not file_list:
+        return coverage
+
+    files_key = indexed_files_key(wallet_address, hash_version)
+    file_ids = [file.get("fileId") for file in file_list]
+    already_indexed = redis_client.smismember(files_key, file_ids)
+    pending = [file for file, indexed in zip(file_list, already_indexed) if not indexed]
+    coverage["already_indexed"] = len(file_list) - len(pending)
+    coverage["files_considered"] = coverage["already_indexed"]
+    if not pending:
+        return coverage
+
+    pipeline = redis_client.pipeline()
+    for file in pending:
+        pipeline.get(history_key(file.get("fileId"), hash_version))
+    stored_data_list = pipeline.execute()
+
+    processed_files = [codec.decode(stored_data) if stored_data else None for stored_data in stored_data_list]
+    missing = [idx for idx, processed in enumerate(processed_files) if processed is None]
+    coverage["redis_hits"] = len(pending) - len(missing)
+    not_loaded = set()
+    if missing and load_missing:
+        not_loaded = set(missing)
+        for idx, processed in load_missing([pending[position] for position in missing]):
+            processed_files[missing[idx]] = processed
+            not_loaded.discard(missing[idx])
+            coverage["downloaded"] += processed is not None
+    coverage["not_loaded"] = len(not_loaded)
+    coverage["deadline_reached"] = bool(not_loaded)
+
+    indexed = 0
+    pipeline = redis_client.pipeline()
+    for position, (file, processed) in enumerate(zip(pending, processed_files)):
+        if position in not_loaded:
+            continue
+        if processed is None:
+            logging.warning(f"Skipping index backfill for fileId {file.get('fileId')}: no data available.")
+            coverage["failed"] += 1
+            continue
+        add_to_index(pipeline, wallet_address, processed, use_global, hash_version)
+        pipeline.sadd(files_key, file.get("fileId"))
+        indexed += 1
+    pipeline.execute()
+    coverage["files_considered"] += indexed
+    if not_loaded:
+        logging.warning(f"History deadline reached, {len(not_loaded)} earlier files not loaded into the index")
+    logging.info(f"Backfilled {indexed} files into the uniqueness index of {wallet_address}")
+    return coverage
+
+
+def index_uniqueness(redis_client, wallet_address, curr_file_id, processed_curr_data, use_global=False,
+                     hash_version=HASH_VERSION_LEGACY):
+    """
+    Score the current file against the hash sets and add its hashes to them.
+
+    A hash is unique if it is in neither the wallet's set for its type nor, when use_global is
+    set, the global set for that type. The result is stored per fileId so a retried proof for the
+    same file returns the original result instead of comparing the file against itself.
+    :return: Same shape as compare_secured_data
+    """
+    files_key = indexed_files_key(wallet_address, hash_version)
+    if curr_file_id and redis_client.sismember(files_key, curr_file_id):
+        stored_result = redis_client.get(file_result_key(curr_file_id, hash_version))
+        if stored_result:
+            logging.info(f"File {curr_file_id} already indexed, reusing its uniqueness result")
+            return json.loads(stored_result)
+
+    curr_hashes = {task_type: sorted(hashes) for task_type, hashes in hashes_by_type(processed_curr_data).items()}
+
+    pipeline = redis_client.pipeline()
+    queued = []
+    for task_type, hashes in curr_hashes.items():
+        for chunk in _chunks(hashes):
+            pipeline.smismember(wallet_set_key(wallet_address, task_type, hash_version), chunk)
+            if use_global:
+                pipeline.smismember(global_set_key(task_type, hash_version), chunk)
+            queued.append((task_type, chunk))
+    replies = iter(pipeline.execute())
+
+    unique_counts = {task_type: 0 for task_type in curr_hashes}
+    for task_type, chunk in queued:
+        seen = next(replies)
+        if use_global:
+            seen = [in_wallet or in_global for in_wallet, in_global in zip(seen, next(replies))]
+        unique_counts[task_type] += sum(1 for member in seen if not member)
+
+    result = []
+    for task_type, hashes in curr_hashes.items():
+        total = len(hashes)
+        result.append({
+            "type": task_type,
+            "unique_hashes_in_curr": unique_counts[task_type],
+            "total_hashes_in_curr": total,
+            "type_unique_score": unique_counts[task_type] / total if total else 0
+        })
+    total_normalized_score = sum(entry["type_unique_score"] for entry in result) / len(result) if result else 0
+    response = {
+        "comparison_results": result,
+        "total_normalized_score": total_normalized_score
+    }
+
+    pipeline = redis_client.pipeline()
+    add_to_index(pipeline, wallet_address, processed_curr_data, use_global, hash_version)
+    if curr_file_id:
+        pipeline.set(file_result_key(curr_file_id, hash_version), json.dumps(response))
+        pipeline.sadd(files_key, curr_file_id)
+    pipeline.execute()
+
+    logging.info(f"Index uniqueness, normalized score: {total_normalized_score}")
+    return response
+
+
+def _blob_hash_version(key):
+    _, separator, suffix = key.rpartition(":h")
+    return int(suffix) if separator and suffix.isdigit() else HASH_VERSION_LEGACY
+
+def backfill_global_index(redis_client, hash_version=HASH_VERSION_LEGACY):
+    """
+    Fold every per-file blob of the given hash version in Redis into the global hash sets.
+
+    Blobs are read with one pipelined GET per SCAN page. Keys that are not blobs, e.g. sets or
+    hashes of other features, are skipped.
+
+    Wallet sets cannot be built this way since blobs do not record their wallet; those are
+    backfilled lazily by backfill_wallet_index on each wallet's first proof in index mode.
+    :return: Number of blobs folded in
+    """
+    from redis.exceptions import ResponseError
+
+    indexed = 0
+    cursor = 0
+    match = f"{REDIS_NAMESPACE}*" if REDIS_NAMESPACE else None
+    while True:
+        cursor, keys = redis_client.scan(cursor, match=match, count=SCAN_COUNT)
+        keys = [key.decode() if isinstance(key, bytes) else str(key) for key in keys]
+        keys = [key for key in keys if not key.startswith(f"{INDEX_PREFIX}:") and _blob_hash_version(key) == hash_version]
+        if keys:
+            reads = redis_client.pipeline(transaction=False)
+            for key in keys:
+                reads.get(key)
+            pipeline = redis_client.pipeline()
+            for stored_data in reads.execute(raise_on_error=False):
+                if isinstance(stored_data, ResponseError):
+                    continue  # WRONGTYPE: not a string, so not a blob
+                try:
+                    processed = codec.decode(stored_data or "null")
+                except (TypeError, ValueError, zlib.error):
+                    continue
+                if not isinstance(processed, list) or not all(isinstance(entry, dict) and "type" in entry for entry in processed):
+                    continue
+                for task_type, hashes in hashes_by_type(processed).items():
+                    for chunk in _chunks(list(hashes)):
+                        pipeline.sadd(global_set_key(task_type, hash_version), *chunk)
+                indexed += 1
+            pipeline.execute()
+        if not int(cursor):
+            return indexed
+
+if __name__ == "__main__":
+    from my_proof.log_utils import configure_logging
+    from my_proof.proof_of_uniqueness import get_redis_client
+
+    configure_logging()
+    hash_version = int(os.environ.get('HASH_VERSION', HASH_VERSION_LEGACY))
+    client = get_redis_client()
+    if not client:
+        logging.error("Redis is not reachable, check REDIS_HOST, REDIS_PORT and REDIS_PWD")
+        sys.exit(1)
+    logging.info(f"Backfilled {backfill_global_index(client, hash_version)} files into the global uniqueness index")
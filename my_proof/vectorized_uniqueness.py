@@ -0,0 +1,154 @@
+import logging
+
+import numpy as np
+
+# Digests are compared by their first 8 bytes. With 64-bit prefixes a false match needs about
+# 4 billion hashes of one type and field before it becomes likely.
+PREFIX_HEX_CHARS = 16
+FOLD_MIN_SIZE = 1 << 16  # Pending prefixes per field before they are merged into the set
+
+
+def digest_prefixes(digests) -> np.ndarray:
+    """Convert hex digests to an array of their 64-bit prefixes."""
+    digests = list(digests)
+    if not digests:
+        return np.empty(0, dtype=np.uint64)
+    width = len(digests[0])
+    joined = "".join(digests)
+    if width >= PREFIX_HEX_CHARS and width % 2 == 0 and len(joined) == width * len(digests):
+        # Uniform digests: decode them all at once and keep the first 8 bytes of each row
+        rows = np.frombuffer(bytes.fromhex(joined), dtype=np.uint8).reshape(len(digests), width // 2)
+        return np.ascontiguousarray(rows[:, :8]).view(">u8").ravel().astype(np.uint64)
+    packed = bytes.fromhex("".join(digest[:PREFIX_HEX_CHARS].ljust(PREFIX_HEX_CHARS, "0") for digest in digests))
+    return np.frombuffer(packed, dtype=">u8").astype(np.uint64)
+
+def field_digests(value):
+    """Hex digests of one processed securedSharedData field, whatever its shape."""
+    if isinstance(value, dict):
+        return value.values()
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        return [value]
+    return []
+
+class DigestSetAccumulator:
+    """
+    Folds earlier files into sorted unique digest prefixes per type and field.
+
+    Each file is converted to prefix arrays as it arrives and the caller can drop it right away.
+    New arrays are merged into the running set once they outgrow it, so memory tracks the number
+    of distinct hashes rather than the number of files.
+    """
+
+    def __init__(self):
+        self._merged = {}
+        self._pending = {}
+        self.files = 0
+
+    def add(self, processed_file, position=None):
+        self.files += 1
+        for entry in processed_file:
+            task_type = entry.get("type")
+            for key, value in (entry.get("securedSharedData") or {}).items():
+                pending = self._pending.setdefault((task_type, key), [])
+                pending.append(digest_prefixes(field_digests(value)))
+                merged = self._merged.get((task_type, key))
+                if sum(len(array) for array in pending) >= max(FOLD_MIN_SIZE, len(merged) if merged is not None else 0):
+                    self._fold(task_type, key)
+
+    def _fold(self, task_type, key):
+        arrays = self._pending.pop((task_type, key), [])
+        merged = self._merged.get((task_type, key))
+        if merged is not None:
+            arrays.append(merged)
+        self._merged[(task_type, key)] = np.unique(np.concatenate(arrays)) if arrays else np.empty(0, dtype=np.uint64)
+
+    def _fold_all(self):
+        for task_type, key in list(self._pending):
+            self._fold(task_type, key)
+
+    def merged(self):
+        """:return: {type: {field: sorted unique uint64 prefixes}}"""
+        self._fold_all()
+        history = {}
+        for (task_type, key), array in self._merged.items():
+            history.setdefault(task_type, {})[key] = array
+        return history
+
+    def distinct_hashes(self):
+        self._fold_all()
+        return sum(len(array) for array in self._merged.values())
+
+    def compare(self, processed_curr_data):
+        return compare_with_history(processed_curr_data, self.merged())
+
+def merge_history(processed_old_data):
+    """
+    Merge every earlier file's hashes per type and field.
+
+    :return: {type: {field: sorted unique uint64 prefixes}}
+    """
+    accumulator = DigestSetAccumulator()
+    accumulator.add(processed_old_data)
+    return accumulator.merged()
+
+def _is_member(values: np.ndarray, sorted_unique: np.ndarray) -> np.ndarray:
+    if not len(sorted_unique):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_unique, values), len(sorted_unique) - 1)
+    return sorted_unique[positions] == values
+
+def compare_with_history(processed_curr_data, merged_history):
+    """Score processed_curr_data against history already merged by merge_history."""
+    result = []
+    total_score = 0
+
+    curr_dict = {item["type"]: item["securedSharedData"] for item in processed_curr_data}
+    for task_type, curr_secured_data in curr_dict.items():
+        old_fields = merged_history.get(task_type)
+
+        if old_fields is None:
+            # Type never seen before, every hash is unique
+            all_hashes = np.unique(np.concatenate(
+                [digest_prefixes(field_digests(value)) for value in curr_secured_data.values()] or
+                [np.empty(0, dtype=np.uint64)]
+            ))
+            unique_count = total_count = len(all_hashes)
+            type_unique_score = 1.0
+        else:
+            unique_parts = []
+            total_parts = []
+            for key, old_hashes in old_fields.items():
+                # Sorted queries keep searchsorted cache friendly
+                curr_hashes = np.unique(digest_prefixes(field_digests(curr_secured_data.get(key))))
+                unique_parts.append(curr_hashes[~_is_member(curr_hashes, old_hashes)])
+                total_parts.append(curr_hashes)
+            unique_count = len(np.unique(np.concatenate(unique_parts))) if unique_parts else 0
+            total_count = len(np.unique(np.concatenate(total_parts))) if total_parts else 0
+            type_unique_score = (unique_count / total_count) if total_count else 0
+
+        total_score += type_unique_score
+        result.append({
+            "type": task_type,
+            "unique_hashes_in_curr": unique_count,
+            "total_hashes_in_curr": total_count,
+            "type_unique_score": type_unique_score
+        })
+
+    total_normalized_score = total_score / len(result) if result else 0
+    logging.info(f"Final Result, normalized score: {total_normalized_score}")
+    return {
+        "comparison_results": result,
+        "total_normalized_score": total_normalized_score
+    }
+
+def compare_secured_data_vectorized(processed_curr_data: list, processed_old_data: list):
+    """
+    Drop-in replacement for compare_secured_data that compares against all earlier files.
+
+    compare_secured_data keeps only the last earlier contribution of each type; here the hashes
+    of every earlier contribution are merged per type and field before comparing. Fields are
+    matched by name regardless of whether they hold a dict, a list or a single hash.
+    """
+    return compare_with_history(processed_curr_data, merge_history(processed_old_data))
@@ -0,0 +1,194 @@
+"""
+Long-running proof worker.
+
+Keeps the imports, the Redis client, the HTTP session and the GPG wrapper of one process warm and
+scores jobs sent over HTTP, on a Unix socket or a localhost port:
+
+    python -m my_proof.worker --socket /run/proof.sock
+    python -m my_proof.worker --port 8080
+
+    POST /jobs    {"input": <path to input .json or .zip>, "file_id": ..., "signature": ...,
+                   "output_dir": <optional, gets results.json and metrics.json>}
+                  -> the results.json payload
+    GET  /health  -> {"ok": true, "jobs": <jobs done>}
+
+Jobs run one at a time. Between jobs the worker resets the metrics, forgets memoized digests and
+removes the job's scratch directory, which holds every temporary file of the job (decrypted
+history downloads included), so nothing of one contributor's data is left for the next job.
+Settings other than fileId and signature come from the environment, as for a single run.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from my_proof import hashing, http_client
+from my_proof.__main__ import load_config
+from my_proof.archive import iter_input_file
+from my_proof.metrics import metrics
+from my_proof.proof import Proof
+from my_proof.proof_of_uniqueness import get_gpg, get_redis_client
+
+SCRATCH_ROOT = os.environ.get('WORKER_SCRATCH_DIR') or None  # Defaults to the system temp dir
+MAX_JOB_BYTES = 1024 * 1024  # Size cap of a job request body, not of the input it points to
+
+
+class JobError(ValueError):
+    """The job request itself is invalid."""
+
+
+class ProofWorker:
+    def __init__(self, config):
+        self.config = config
+        self.jobs_done = 0
+        self._job_lock = threading.Lock()
+
+    def warm_up(self):
+        """Open the connections and start the helpers every job needs, before the first job."""
+        http_client.get_session()
+        get_gpg()
+        if get_redis_client() is None:
+            logging.warning("Redis is not reachable, jobs will download history until it is")
+
+    def run_job(self, job):
+        """
+        Score one job in isolation.
+
+        :return: The results.json payload of the job
+        """
+        input_path = job.get('input')
+        if not input_path or not os.path.isfile(input_path):
+            raise JobError(f"Input file not found: {input_path}")
+
+        with self._job_lock:
+            metrics.reset()
+            hashing.clear_memo()
+            scratch = tempfile.mkdtemp(prefix="proof-job-", dir=SCRATCH_ROOT)
+            previous_tempdir = tempfile.tempdir
+            # Every TemporaryDirectory of the job, e.g. per history download, is created in here
+            tempfile.tempdir = scratch
+            try:
+                config = dict(self.config, input_dir=os.path.dirname(input_path))
+                config['file_id'] = job.get('file_id') or config.get('file_id')
+                config['signature'] = job.get('signature') or config.get('signature')
+                logging.info(f"Job for fileId {config['file_id']} started")
+
+                # Every document of the input is scored, as a single run scores its input_dir
+                proof = Proof(config)
+                result = None
+                for member_name, input_data in iter_input_file(input_path):
+                    if member_name:
+                        logging.info(f"Processing archive member: {member_name}")
+                    result = proof.score_input(input_data)
+                if result is None:
+                    raise JobError(f"No JSON document found in the input: {input_path}")
+                if config.get('metrics_in_attributes'):
+                    result.setdefault('attributes', {})['metrics'] = metrics.summary()
+
+                output_dir = job.get('output_dir')
+                if output_dir:
+                    with open(os.path.join(output_dir, "results.json"), 'w', encoding='utf-8') as f:
+                        json.dump(result, f, indent=2)
+                    metrics.write(os.path.join(output_dir, "metrics.json"))
+                return result
+            finally:
+                tempfile.tempdir = previous_tempdir
+                shutil.rmtree(scratch, ignore_errors=True)
+                hashing.clear_memo()
+                self.jobs_done += 1
+
+
+def make_handler(worker):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                return self._reply(200, {"ok": True, "jobs": worker.jobs_done})
+            self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                return self._reply(404, {"error": "not found"})
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_JOB_BYTES:
+                return self._reply(413, {"error": "job request too large"})
+            start = time.perf_counter()
+            try:
+                job = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(job, dict):
+                    raise JobError("Job must be a JSON object")
+                result = worker.run_job(job)
+            except (JobError, json.JSONDecodeError) as error:
+                return self._reply(400, {"error": str(error)})
+            except Exception as error:
+                logging.error(f"Job failed: {error}")
+                return self._reply(500, {"error": str(error)})
+            logging.info(f"Job finished in {time.perf_counter() - start:.3f}s")
+            self._reply(200, result)
+
+    return Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("local", 0)
+
+
+def serve(worker, socket_path=None, port=None, host="127.0.0.1"):
+    handler = make_handler(worker)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        os.chmod(socket_path, 0o600)
+        logging.info(f"Proof worker listening on {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        logging.info(f"Proof worker listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve proof jobs from a warm process")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--socket', help="Unix socket path")
+    target.add_argument('--port', type=int, help="Localhost TCP port")
+    args = parser.parse_args()
+
+    worker = ProofWorker(load_config())
+    worker.warm_up()
+    try:
+        serve(worker, socket_path=args.socket, port=args.port)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())